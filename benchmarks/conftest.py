@@ -0,0 +1,83 @@
+import functools
+import glob
+import os
+import tracemalloc
+
+import pytest
+from pytest_benchmark.utils import get_machine_id, parse_compare_fail
+
+from ec3.ec3_transport import synthetic_records
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+COMPARE_FAIL = "min:25%"
+
+
+def pytest_addoption(parser):
+    parser.addoption(
+        "--compare-baseline",
+        action="store_true",
+        help="Compare against the latest run saved with --benchmark-save=baseline on this machine "
+        "and fail when the fastest round of a benchmark is more than 25%% slower",
+    )
+
+
+@pytest.hookimpl(tryfirst=True)
+def pytest_configure(config):
+    # Keep saved runs next to the benchmarks, wherever pytest is started from
+    if config.getoption("benchmark_storage") == "file://./.benchmarks":
+        config.option.benchmark_storage = "file://" + RESULTS_DIR
+
+    if not config.getoption("compare_baseline"):
+        return
+
+    # Timings are only comparable on the runner that saved the baseline, so it is never committed
+    baselines = sorted(
+        glob.glob(os.path.join(RESULTS_DIR, get_machine_id(), "*_baseline.json"))
+    )
+    if not baselines:
+        raise pytest.UsageError(
+            "No baseline saved on this machine. Run the benchmarks with "
+            "--benchmark-save=baseline on the reference commit first."
+        )
+    config.option.benchmark_compare = os.path.basename(baselines[-1])[: -len(".json")]
+    config.option.benchmark_compare_fail = [parse_compare_fail(COMPARE_FAIL)]
+
+
+def peak_memory(function, *args, **kwargs):
+    """
+    Runs function once more under tracemalloc and returns the peak memory allocated, in MB
+    tracemalloc slows Python down, so this run is kept out of the timed rounds.
+    """
+    tracemalloc.start()
+    try:
+        function(*args, **kwargs)
+        return tracemalloc.get_traced_memory()[1] / 2**20
+    finally:
+        tracemalloc.stop()
+
+
+@functools.lru_cache(maxsize=None)
+def cached_records(count):
+    """
+    Returns synthetic records, generated once per session for each count
+    """
+    return synthetic_records(count)
+
+
+def deep_category_tree(depth, branching, prefix="0"):
+    """
+    Returns a categories tree with branching subcategories per node down to depth levels
+    """
+    node = {
+        "id": prefix,
+        "name": "Category {}".format(prefix),
+        "display_name": "Display {}".format(prefix),
+        "masterformat": "{} Masterformat".format(prefix),
+        "subcategories": [],
+    }
+    if depth > 1:
+        node["subcategories"] = [
+            deep_category_tree(depth - 1, branching, "{}.{}".format(prefix, i))
+            for i in range(branching)
+        ]
+    return node
@@ -0,0 +1,21 @@
+import pytest
+
+from ec3.ec3_utils import get_nominatim, postal_to_latlong_batch
+
+# 1000 five digit US postal codes spread over the whole range
+POSTAL_CODES = ["{:05d}".format(501 + i * 99) for i in range(1000)]
+
+
+@pytest.fixture(scope="module")
+def us_dataset():
+    pytest.importorskip("pgeocode")
+    try:
+        return get_nominatim("US")
+    except Exception as exc:  # The postal dataset is downloaded on first use
+        pytest.skip("pgeocode postal dataset unavailable: {}".format(exc))
+
+
+def test_postal_to_latlong_batch(benchmark, us_dataset):
+    coords = benchmark(postal_to_latlong_batch, POSTAL_CODES, "US")
+
+    assert len(coords) == len(POSTAL_CODES)
@@ -0,0 +1,93 @@
+import pytest
+
+from ec3 import EC3Materials
+from ec3.ec3_transport import EC3SyntheticTransport
+
+from conftest import cached_records, peak_memory
+
+
+def pull_all(ec3_materials):
+    """
+    Streams every page of the pull and returns the number of records received
+    """
+    received = 0
+    for page in ec3_materials.iter_materials(by_page=True, params={}):
+        received += len(page)
+    return received
+
+
+def record_metrics(benchmark, transport, pulls, record_count, pull, *args, **kwargs):
+    """
+    Adds the request count, throughput and peak memory of a pull to the benchmark's extra_info
+    pulls is the number of pulls the transport served so far (timed and warmup rounds).
+    """
+    if benchmark.stats is None:
+        # Benchmarks disabled, the pull only ran once as a test
+        return
+    benchmark.extra_info["requests_per_pull"] = transport.requests // pulls
+    benchmark.extra_info["records_per_second"] = round(
+        record_count / benchmark.stats.stats.min
+    )
+    benchmark.extra_info["peak_memory_mb"] = round(
+        peak_memory(pull, *args, **kwargs), 1
+    )
+
+
+@pytest.mark.parametrize(
+    "record_count, rounds",
+    [(10_000, 5), (100_000, 2), (1_000_000, 1)],
+    ids=["10k", "100k", "1M"],
+)
+def test_pagination(benchmark, record_count, rounds):
+    transport = EC3SyntheticTransport(cached_records(record_count))
+    ec3_materials = EC3Materials(bearer_token="unused")
+    ec3_materials.only_valid = False
+    ec3_materials.transport = transport
+
+    received = benchmark.pedantic(
+        pull_all, args=(ec3_materials,), rounds=rounds, warmup_rounds=0
+    )
+
+    assert received == record_count
+    record_metrics(benchmark, transport, rounds, record_count, pull_all, ec3_materials)
+
+
+def test_get_all_10k(benchmark):
+    transport = EC3SyntheticTransport(cached_records(10_000))
+    ec3_materials = EC3Materials(bearer_token="unused")
+    ec3_materials.only_valid = False
+    ec3_materials.transport = transport
+
+    records = benchmark.pedantic(
+        ec3_materials.get_materials,
+        kwargs={"return_all": True, "params": {}},
+        rounds=10,
+        warmup_rounds=1,
+    )
+
+    assert len(records) == 10_000
+    record_metrics(
+        benchmark,
+        transport,
+        11,
+        10_000,
+        ec3_materials.get_materials,
+        return_all=True,
+        params={},
+    )
+
+
+@pytest.mark.benchmark(group="pagination-workers")
+@pytest.mark.parametrize("max_workers", [1, 2, 4, 8])
+def test_pagination_workers(benchmark, max_workers):
+    # 20 pages with 50 ms of latency each, so the pull is dominated by waiting on the server
+    transport = EC3SyntheticTransport(cached_records(5_000), latency=0.05)
+    ec3_materials = EC3Materials(bearer_token="unused")
+    ec3_materials.only_valid = False
+    ec3_materials.transport = transport
+    ec3_materials.max_workers = max_workers
+
+    received = benchmark.pedantic(pull_all, args=(ec3_materials,), rounds=3)
+
+    assert received == 5_000
+    benchmark.extra_info["requests_per_pull"] = transport.requests // 3
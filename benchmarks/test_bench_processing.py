@@ -0,0 +1,46 @@
+import json
+
+import pytest
+
+from ec3 import EC3Materials
+from ec3.ec3_utils import build_category_indexes
+
+from conftest import cached_records, deep_category_tree
+
+PAGE = cached_records(250)
+PAGE_BODY = json.dumps(PAGE).encode("utf-8")
+
+
+@pytest.mark.parametrize("remove_nulls", [True, False], ids=["nulls_removed", "raw"])
+def test_decode_page(benchmark, remove_nulls):
+    ec3_materials = EC3Materials(bearer_token="unused")
+    ec3_materials.remove_nulls = remove_nulls
+
+    def decode_page(body):
+        # Nulls are removed while decoding (json) or right after (orjson)
+        return ec3_materials._clean_response(ec3_materials._decode(body))
+
+    page = benchmark(decode_page, PAGE_BODY)
+
+    assert len(page) == 250
+
+
+def test_remove_nulls_page(benchmark):
+    ec3_materials = EC3Materials(bearer_token="unused")
+
+    def fresh_page():
+        return (json.loads(PAGE_BODY),), {}
+
+    page = benchmark.pedantic(ec3_materials._remove_nulls, setup=fresh_page, rounds=200)
+
+    assert all(value is not None for value in page[0].values())
+
+
+def test_build_category_indexes_deep_tree(benchmark):
+    # 7 levels of 4 subcategories, 5461 categories
+    category_tree = deep_category_tree(depth=7, branching=4)
+
+    indexes = benchmark(build_category_indexes, category_tree)
+
+    assert len(indexes["nodes"]) == 5461
+    assert len(indexes["ancestors"]["0.0.0.0.0.0.0"]) == 6
@@ -1,7 +1,34 @@
 __version__ = "0.0.9"
 
-from .ec3_materials import EC3Materials
-from .ec3_epds import EC3epds
-from .ec3_urls import EC3URLs
-from .ec3_projects import EC3Projects
-from .ec3_categories import EC3Categories
+import importlib
+
+# Public classes and the module defining them. Modules are only imported when one of their
+# classes is first accessed, so scripts using a single service do not pay for the others.
+_LAZY_ATTRIBUTES = {
+    "EC3Materials": ".ec3_materials",
+    "EC3epds": ".ec3_epds",
+    "EC3URLs": ".ec3_urls",
+    "EC3Projects": ".ec3_projects",
+    "EC3Categories": ".ec3_categories",
+    "EC3Client": ".ec3_client",
+    "AsyncEC3Materials": ".ec3_async",
+    "AsyncEC3epds": ".ec3_async",
+    "AsyncEC3Projects": ".ec3_async",
+    "AsyncEC3Categories": ".ec3_async",
+}
+
+__all__ = list(_LAZY_ATTRIBUTES)
+
+
+def __getattr__(name):
+    module_name = _LAZY_ATTRIBUTES.get(name)
+    if module_name is None:
+        raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
+
+    value = getattr(importlib.import_module(module_name, __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
@@ -1,6 +1,26 @@
 import abc
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+import contextvars
+import json
+import math
+import time
+
 import requests
 
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+from .ec3_metrics import instrumented
+from .ec3_models import EC3Model
+from .ec3_retry import rate_limiter, retry_policy
+from .ec3_utils import build_projection, project_record
+
+MAX_PAGE_SIZE = 250
+
 
 class EC3Abstract(metaclass=abc.ABCMeta):
     """
@@ -8,27 +28,55 @@ class EC3Abstract(metaclass=abc.ABCMeta):
 
     This class get inherited by other major classes.
 
-    :ivar int page_size: Specifies the page size to return. Max allowed by api is 250, defaults to 100
+    :ivar int page_size: Specifies the page size to return when auto_page_size is False. Max allowed by api is 250, defaults to 100
+    :ivar bool auto_page_size: If True pages are sized automatically, the Api maximum for bulk pulls and just enough pages for max_records otherwise, defaults to True
+    :ivar bool prefetch: If True the next page is requested in the background while the current one is processed, defaults to True
     :ivar int max_records: Specifies the maximum number of records to return, defaults to 100
     :ivar bool remove_nulls: Keep as True to remove fields with null values. Set to False to return all fields, defaults to True
+    :ivar EC3ResponseCache cache: Optional response cache used for GET requests (see ec3.ec3_cache), defaults to None
+    :ivar int max_workers: Number of pages requested in parallel. Set above 1 to enable, defaults to 1
+    :ivar EC3RetryPolicy retry_policy: Retry and backoff settings for failed or throttled requests (None to disable), defaults to the shared ec3.ec3_retry.retry_policy
+    :ivar EC3RateLimiter rate_limiter: Token bucket limiting the request rate (None to disable), defaults to the shared ec3.ec3_retry.rate_limiter
+    :ivar callable json_decoder: Function decoding the response body bytes (ex: orjson.loads). None uses orjson when installed and the standard library otherwise, defaults to None
+    :ivar EC3Instrumentation instrumentation: Optional hooks, timings and spans of Api calls (see ec3.ec3_metrics), defaults to None
+    :ivar float timeout: Seconds to wait for the server (or a (connect, read) tuple). None waits forever, defaults to None
+    :ivar transport: Optional object sending requests in place of the session, such as EC3RecordingTransport or EC3ReplayTransport (see ec3.ec3_transport), defaults to None
+    :ivar type result_model: Optional model class records are returned as instead of dictionaries, such as ec3.ec3_models.Material (see ec3.ec3_models), defaults to None
 
     """
 
-    def __init__(self, bearer_token, response_format="json", ssl_verify=True):
+    _http_error = requests.exceptions.HTTPError
+
+    def __init__(
+        self, bearer_token, response_format="json", ssl_verify=True, session=None
+    ):
         """
         Args:
             bearer_token (str): EC3 bearer token for the user
             response_format (str, optional): Defaults to "json".
             ssl_verify (bool, optional): Defaults to True.
+            session (requests.Session, optional): Session to send requests over, shared with other clients (see ec3.ec3_client.EC3Client). Defaults to a new session.
         """
 
-        session = requests.Session()
+        if session is None:
+            session = requests.Session()
         self.bearer_token = bearer_token
         self.session = session
         self.session.headers.update({"Authorization": "Bearer {}".format(bearer_token)})
 
         self.page_size = 100
+        self.auto_page_size = True
+        self.prefetch = True
         self.max_records = 100
+        self.max_workers = 1
+        self.cache = None
+        self.retry_policy = retry_policy
+        self.rate_limiter = rate_limiter
+        self.json_decoder = None
+        self.instrumentation = None
+        self.timeout = None
+        self.transport = None
+        self.result_model = None
 
         self.format = response_format
         self._ssl_verify = ssl_verify
@@ -50,7 +98,7 @@ class EC3Abstract(metaclass=abc.ABCMeta):
         """
         try:
             response.raise_for_status()
-        except requests.exceptions.HTTPError as exc:
+        except self._http_error as exc:
             err_msg = str(exc)
 
             # Attempt to get Error message from response
@@ -64,97 +112,437 @@ class EC3Abstract(metaclass=abc.ABCMeta):
             exc.args = (*exc.args, err_msg)
             raise exc
         else:
-            # if user put in anything other than True or False, assume True
-            if type(self.remove_nulls) != bool:
-                self.remove_nulls = True
-
-            if self.remove_nulls is True:
-                ec3_response = response.json()
-                if isinstance(ec3_response, dict):
-                    cleaned_response = self._remove_nulls(ec3_response)
-                else:
-                    cleaned_response = [self._remove_nulls(d) for d in ec3_response]
-                return cleaned_response
+            if self.instrumentation is None:
+                return self._clean_response(self._decode(response.content))
+
+            started = time.perf_counter()
+            ec3_response = self._decode(response.content)
+            decoded = time.perf_counter()
+            ec3_response = self._clean_response(ec3_response)
+
+            self.instrumentation.add("decode", decoded - started)
+            self.instrumentation.add("postprocess", time.perf_counter() - decoded)
+            if isinstance(ec3_response, list):
+                self.instrumentation.add("pages", 1)
+                self.instrumentation.add("records", len(ec3_response))
+            return ec3_response
+
+    def _decode(self, content):
+        """
+        Decodes the json response body.
+
+        With the standard library decoder nulls are dropped as each object is built, if set to do so.
+        Faster decoders such as orjson have no object hook, so _clean_response removes nulls
+        in a single iterative pass after the records are pruned to return_fields.
+
+        Args:
+            content (bytes): Response body
+
+        Returns:
+            json: Decoded response
+        """
+        # if user put in anything other than True or False, assume True
+        if type(self.remove_nulls) != bool:
+            self.remove_nulls = True
+
+        decoder = self._fast_decoder()
+        if decoder is None:
+            if self.remove_nulls:
+                return json.loads(content, object_pairs_hook=_without_nulls)
+            return json.loads(content)
+        return decoder(content)
+
+    def _fast_decoder(self):
+        """
+        Returns the decoder used instead of the standard library json module (None if there is none)
+        """
+        if self.json_decoder is not None:
+            return self.json_decoder
+        if orjson is not None:
+            return orjson.loads
+        return None
+
+    def _clean_response(self, ec3_response):
+        """
+        Prunes each record of the decoded response to the dotted return_fields, if any are set,
+        removes the null values left by a fast decoder from the pruned records,
+        then wraps each record in result_model, if set.
+
+        Args:
+            ec3_response (dict | list): Decoded json response
+
+        Returns:
+            json: Processed records as json
+        """
+        # Pruning first means the subtrees being dropped are never walked for nulls
+        return_fields = getattr(self, "return_fields", None)
+        if return_fields and isinstance(ec3_response, list):
+            projection = build_projection(tuple(return_fields))
+            ec3_response = [project_record(d, projection) for d in ec3_response]
+        if self.remove_nulls and self._fast_decoder() is not None:
+            ec3_response = self._remove_nulls(ec3_response)
+        if self.result_model is not None and isinstance(ec3_response, list):
+            ec3_response = [self.result_model(d) for d in ec3_response]
+        return ec3_response
+
+    def _send(self, method, url, params=None):
+        """
+        Sends the request and returns the raw response
+        GET requests go through the response cache when one is set.
+        """
+        query = params["params"] if params else None
+
+        if self.cache is not None and method.lower() == "get":
+            return self.cache.send(
+                self._send_with_retries,
+                method,
+                url,
+                params=query,
+                authorization=self.session.headers.get("Authorization"),
+            )
+
+        return self._send_with_retries(method, url, params=query)
+
+    def _send_with_retries(self, method, url, params=None, headers=None, data=None):
+        """
+        Sends the request over the session, waiting on the rate limiter before each attempt
+        and retrying throttled, failed or dropped attempts according to the retry policy.
+        Every request, including POST requests with a data body, should be sent through here.
+        """
+        attempt = 0
+        instrumentation = self.instrumentation
+
+        while True:
+            if self.rate_limiter is not None:
+                self.rate_limiter.acquire()
+
+            if instrumentation is not None:
+                instrumentation.before_request(method, url, params)
+                started = time.perf_counter()
+
+            try:
+                # When instrumented, the body is read separately to time the transfer
+                response = self._http_request(
+                    method,
+                    url,
+                    params=params,
+                    data=data,
+                    headers=headers,
+                    verify=self._ssl_verify,
+                    timeout=self.timeout,
+                    stream=instrumentation is not None,
+                )
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+                if self.retry_policy is None or not self.retry_policy.should_retry(
+                    method, attempt
+                ):
+                    raise
+                response = None
             else:
-                return response.json()
+                if instrumentation is not None:
+                    received = time.perf_counter()
+                    response.content
+                    instrumentation.after_request(
+                        method,
+                        url,
+                        response,
+                        received - started,
+                        time.perf_counter() - received,
+                    )
+
+                if self.retry_policy is None or not self.retry_policy.should_retry(
+                    method, attempt, response
+                ):
+                    return response
+
+            time.sleep(self.retry_policy.get_backoff(attempt, response))
+            attempt += 1
+
+    def _span(self, name):
+        """
+        Returns a span context manager when instrumented, otherwise a no-op context manager
+        """
+        if self.instrumentation is None:
+            return nullcontext()
+        return self.instrumentation.span(name)
+
+    def _http_request(self, method, url, **kwargs):
+        """
+        Sends a single HTTP request over the transport if one is set, otherwise over the session
+        """
+        if self.transport is not None:
+            return self.transport.request(self.session, method, url, **kwargs)
+        return self.session.request(method, url, **kwargs)
+
+    def _get_category_tree(self):
+        """
+        Gets the entire categories tree over this client's session, transport, cache and timeout
+        """
+        return self._request("get", self.url.categories_tree_url())
+
+    def _load_category_registry(self, force=False):
+        """
+        Downloads the categories tree into the shared category registry if it is missing or stale
+        Called before _process_params, which only reads the loaded registry.
+        """
+        # ec3_categories imports this module
+        from .ec3_categories import category_registry
+
+        return category_registry.load(self._get_category_tree, force=force)
 
+    @instrumented("request")
     def _request(self, method, url, params=None):
-        if params:
-            response = self.session.request(
-                method, url, verify=self._ssl_verify, params=params["params"]
-            )
-        else:
-            response = self.session.request(method, url, verify=self._ssl_verify)
+        response = self._send(method, url, params=params)
 
         return self._process_response(response)
 
-    def _get_records(self, url, **params):
+    @instrumented("request")
+    def _fetch_page(self, url, page_number, params):
         """
-        Returns the requested number of records.
+        Requests a single page and returns its records with the total number of pages
+        reported by the response headers (None if not reported)
+        """
+        page_params = {"params": dict(params["params"], page_number=page_number)}
+        response = self._send("get", url, params=page_params)
+        records = self._process_response(response)
+        return records, self._total_pages(response, page_params["params"]["page_size"])
 
-        This will only return the first (or specified #) page when number of records exceeds page size.
+    def _is_past_last_page(self, exc):
+        """
+        Returns True if the HTTP error means the page number is past the last page (HTTP 404).
+        Any other error is raised instead of silently truncating the results.
         """
-        data = self._request("get", url, params=params)
-        requested_records = data
-        page_number = 1
+        return exc.response is not None and exc.response.status_code == 404
 
-        while len(data) == self.page_size and len(requested_records) < self.max_records:
-            page_number += 1
-            params["params"]["page_number"] = page_number
+    def _total_pages(self, response, page_size=None):
+        """
+        Returns the total number of pages reported by the response headers (None if not reported)
+        """
+        total_pages = response.headers.get("X-Total-Pages")
+        if total_pages is not None and total_pages.isdigit():
+            return int(total_pages)
 
-            try:
-                data = self._request("get", url, params=params)
-            except requests.exceptions.HTTPError:
-                break
+        total_count = response.headers.get("X-Total-Count")
+        if total_count is not None and total_count.isdigit():
+            return max(1, math.ceil(int(total_count) / (page_size or self.page_size)))
 
-            if data:
-                requested_records.extend(data)
+        return None
 
-        if len(requested_records) > self.max_records:
-            return requested_records[0 : self.max_records]
-        else:
-            return requested_records
+    def _page_size_for(self, max_records=None):
+        """
+        Returns the page size to request for a pull of max_records (None for all records)
+
+        Bulk pulls use the Api maximum. Capped pulls use the smallest page size that still
+        fetches max_records in the fewest requests (ex: 300 records as 2 pages of 150).
+        The size stays the same for the whole pull so page numbers keep their offsets.
+        """
+        if not self.auto_page_size:
+            return self.page_size
+        if max_records is None:
+            return MAX_PAGE_SIZE
+
+        pages = max(1, math.ceil(max_records / MAX_PAGE_SIZE))
+        return max(1, math.ceil(max_records / pages))
+
+    @instrumented("get_records")
+    def _get_records(self, url, max_records=None, total_count=None, **params):
+        """
+        Returns the requested number of records.
+
+        This will only return the first (or specified #) page when number of records exceeds page size.
+        Pass max_records to override the instance setting for this call only.
+        """
+        if max_records is None:
+            max_records = self.max_records
+
+        requested_records = []
+        for data in self._iter_pages(
+            url, max_records=max_records, total_count=total_count, **params
+        ):
+            requested_records.extend(data)
+
+        return requested_records[0:max_records]
 
-    def _get_all(self, url, **params):
+    @instrumented("get_all")
+    def _get_all(self, url, total_count=None, **params):
         """
         Returns all the records as a single list
         """
-        hold_val1 = self.max_records
-        self.max_records = 10000000  # temp max value
+        all_records = []
+        for data in self._iter_pages(url, total_count=total_count, **params):
+            all_records.extend(data)
 
-        data = self._get_records(url, **params)
-        all_records = data
-        page_number = 1
+        return all_records
 
-        while len(data) == self.page_size:
-            page_number += 1
-            params["params"]["page_number"] = page_number
+    def _iter_pages(self, url, max_records=None, total_count=None, **params):
+        """
+        Pagination engine used by every get_* and iter_* method.
+        Yields matching records one page at a time, up to max_records if given.
 
-            try:
-                data = self._get_records(url, **params)
-            except requests.exceptions.HTTPError:
-                break
+        Each page is requested exactly once, starting from the page_number in params (default 1).
+        Records already yielded are skipped by id, since offset pages can shift while they are read.
+        Paging stops at the first short page, at the last page reported by the response headers
+        or by the total_count hint (without requesting an empty page), or once max_records are received.
 
-            if data:
-                all_records.extend(data)
+        With prefetch enabled the next page is requested in the background while the caller
+        processes the current one. With max_workers above 1, up to max_workers pages are in flight at once.
+        Pages are always yielded in order. Stopping iteration early skips the remaining requests
+        (pages already in flight are discarded).
 
-        self.max_records = hold_val1
+        Args:
+            url (str): Api url
+            max_records (int, optional): Maximum number of records to return. Defaults to None (all records).
+            total_count (int, optional): Number of matching records if already known. Defaults to None.
+        """
+        page_size, page_params, first_page, last_page, cap_page = self._plan_pages(
+            max_records, total_count, params
+        )
+
+        # Pages kept in flight ahead of the one being processed
+        ahead = self.max_workers if self.max_workers > 1 else int(self.prefetch)
+        executor = ThreadPoolExecutor(max_workers=ahead) if ahead else None
+
+        pending = deque([self._submit_page(executor, url, first_page, page_params)])
+        next_page = first_page + 1
+        received = 0
+        seen_ids = set()
+        try:
+            while pending:
+                page_number, future = pending.popleft()
+                try:
+                    if future is None:
+                        data, total_pages = self._fetch_page(
+                            url, page_number, page_params
+                        )
+                    else:
+                        data, total_pages = future.result()
+                except requests.exceptions.HTTPError as exc:
+                    if page_number == first_page or not self._is_past_last_page(exc):
+                        raise
+                    return
+
+                # The latest headers win, records may have moved since the first page
+                if total_pages is not None:
+                    last_page = (
+                        total_pages if cap_page is None else min(total_pages, cap_page)
+                    )
+                    while pending and pending[-1][0] > last_page:
+                        pending.pop()[1].cancel()
+
+                received += len(data)
+                finished = len(data) < page_size or (
+                    max_records is not None and received >= max_records
+                )
+
+                if not finished:
+                    while len(pending) < max(ahead, 1) and (
+                        last_page is None or next_page <= last_page
+                    ):
+                        pending.append(
+                            self._submit_page(executor, url, next_page, page_params)
+                        )
+                        next_page += 1
+
+                records = self._unseen_records(data, seen_ids)
+                if records:
+                    yield records
+
+                if finished:
+                    return
+        finally:
+            for _, future in pending:
+                if future is not None:
+                    future.cancel()
+            if executor is not None:
+                executor.shutdown(wait=False)
+
+    def _plan_pages(self, max_records, total_count, params):
+        """
+        Returns the page size, the params shared by every page, the first page number,
+        the last page number to request (None until known) and the last page allowed
+        by max_records (None without a cap) for a pull
+        """
+        page_size = self._page_size_for(max_records)
+        page_params = {"params": dict(params["params"], page_size=page_size)}
+        first_page = page_params["params"].get("page_number", 1)
 
-        return all_records
+        last_page = cap_page = None
+        if total_count is not None:
+            last_page = max(1, math.ceil(total_count / page_size))
+        if max_records is not None:
+            cap_page = first_page - 1 + max(1, math.ceil(max_records / page_size))
+            last_page = cap_page if last_page is None else min(last_page, cap_page)
+
+        return page_size, page_params, first_page, last_page, cap_page
+
+    def _unseen_records(self, data, seen_ids):
+        """
+        Returns the records of a page that were not yielded yet, adding their ids to seen_ids
+        Records without an id are always kept.
+        """
+        records = []
+        for record in data:
+            record_id = (
+                record.get("id")
+                if record.__class__ is dict or isinstance(record, EC3Model)
+                else None
+            )
+            if record_id is None:
+                records.append(record)
+            elif record_id not in seen_ids:
+                seen_ids.add(record_id)
+                records.append(record)
+        return records
+
+    def _submit_page(self, executor, url, page_number, params):
+        """
+        Submits a page request to the executor, or defers it when there is none.
+        The caller's context is copied so instrumentation spans cover pages fetched in the background.
+        """
+        if executor is None:
+            return page_number, None
+        future = executor.submit(
+            contextvars.copy_context().run, self._fetch_page, url, page_number, params
+        )
+        return page_number, future
+
+    def _iter_records(self, url, by_page=False, **params):
+        """
+        Yields all matching records (or whole pages if by_page is True) as they arrive
+        """
+        for page in self._iter_pages(url, **params):
+            if by_page:
+                yield page
+            else:
+                yield from page
 
     def _remove_nulls(self, response_dict):
         """
-        Removes key/value pairs where value is None
+        Removes key/value pairs where value is None, at every level of nesting
+        including dictionaries inside lists
 
         Args:
-            response_dict (dict): Response dictionary
+            response_dict (dict | list): Response dictionary (or list of dictionaries)
 
         Returns:
             dict: Cleaned version of input dictionary
         """
-        for key, value in list(response_dict.items()):
-            if value is None:
-                del response_dict[key]
-            elif isinstance(value, dict):
-                self._remove_nulls(value)
+        stack = [response_dict]
+        while stack:
+            node = stack.pop()
+            if node.__class__ is dict:
+                for key, value in list(node.items()):
+                    if value is None:
+                        del node[key]
+                    elif value.__class__ is dict or value.__class__ is list:
+                        stack.append(value)
+            else:
+                for value in node:
+                    if value.__class__ is dict or value.__class__ is list:
+                        stack.append(value)
         return response_dict
+
+
+def _without_nulls(pairs):
+    # object_pairs_hook for json.loads, drops null values while each object is built
+    return {key: value for key, value in pairs if value is not None}
@@ -0,0 +1,1028 @@
+import asyncio
+from collections import deque
+import contextvars
+from datetime import datetime
+import functools
+import json
+import time
+
+try:
+    import httpx
+except ImportError:  # pragma: no cover
+    httpx = None
+
+from .ec3_api import EC3Abstract
+from .ec3_categories import EC3Categories, category_registry
+from .ec3_epds import EC3epds
+from .ec3_materials import DEFAULT_MF_PRAGMA, EC3Materials
+from .ec3_metrics import instrumented
+from .ec3_projects import EC3Projects
+from .ec3_utils import postal_to_latlong
+
+# Headers describing the encoding of the original body, which no longer apply once it is decoded
+_BODY_ENCODING_HEADERS = ("content-encoding", "content-length", "transfer-encoding")
+
+
+def _as_httpx_response(response, method, url):
+    """
+    Returns the response as an httpx.Response
+    Responses served by the cache or a transport are requests responses with an already decoded body.
+    """
+    if isinstance(response, httpx.Response):
+        return response
+
+    headers = {
+        name: value
+        for name, value in response.headers.items()
+        if name.lower() not in _BODY_ENCODING_HEADERS
+    }
+    return httpx.Response(
+        response.status_code,
+        headers=headers,
+        content=response.content,
+        request=httpx.Request(method, url),
+    )
+
+
+def _discard_task(task):
+    """
+    Cancels a page task that is no longer needed
+    The outcome of a task that already finished is retrieved so a failure is not reported as unhandled.
+    """
+    if task is None:
+        return
+    if not task.done():
+        task.cancel()
+    elif not task.cancelled():
+        task.exception()
+
+
+def _httpx_timeout(timeout):
+    """
+    Converts a requests style timeout (seconds or a (connect, read) tuple) to an httpx timeout
+    """
+    if isinstance(timeout, tuple):
+        connect, read = timeout
+        return httpx.Timeout(read, connect=connect)
+    return timeout
+
+
+class AsyncEC3Abstract(EC3Abstract):
+    """
+    Represents the abstract class for asyncio clients of the Building Transparency Api
+
+    Requests are sent over a connection-pooled httpx.AsyncClient. Params, pagination and
+    null removal follow the same conventions as the synchronous classes.
+    Requires the optional httpx dependency (pip install ec3-python-wrapper[async]).
+
+    :ivar int max_concurrency: Maximum number of requests this client will have in flight at once, defaults to 10
+    """
+
+    def __init__(
+        self, bearer_token, response_format="json", ssl_verify=True, max_concurrency=10
+    ):
+        """
+        Args:
+            bearer_token (str): EC3 bearer token for the user
+            response_format (str, optional): Defaults to "json".
+            ssl_verify (bool, optional): Defaults to True.
+            max_concurrency (int, optional): Maximum number of concurrent requests. Defaults to 10.
+        """
+        if httpx is None:
+            raise ImportError(
+                "httpx is required for the asyncio clients. "
+                "Install it with: pip install ec3-python-wrapper[async]"
+            )
+
+        super().__init__(
+            bearer_token, response_format=response_format, ssl_verify=ssl_verify
+        )
+
+        self.max_concurrency = max_concurrency
+        self.client = httpx.AsyncClient(
+            headers={"Authorization": "Bearer {}".format(bearer_token)},
+            verify=ssl_verify,
+            timeout=None,
+            limits=httpx.Limits(
+                max_connections=max_concurrency,
+                max_keepalive_connections=max_concurrency,
+            ),
+        )
+        self._semaphore = None
+
+    @property
+    def _http_error(self):
+        return httpx.HTTPStatusError
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.aclose()
+
+    async def aclose(self):
+        """
+        Closes the underlying connection pool
+        """
+        await self.client.aclose()
+
+    def _get_semaphore(self):
+        # Created lazily so it binds to the running event loop
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._semaphore
+
+    async def _send(self, method, url, params=None, **kwargs):
+        """
+        Sends the request and returns the response
+        GET requests go through the response cache when one is set.
+        """
+        query = params["params"] if params else None
+
+        if self.cache is not None and method.lower() == "get":
+            response = await self.cache.asend(
+                self._send_with_retries,
+                method,
+                url,
+                params=query,
+                authorization=self.client.headers.get("Authorization"),
+            )
+            return _as_httpx_response(response, method, url)
+
+        return await self._send_with_retries(method, url, params=query, **kwargs)
+
+    async def _send_with_retries(self, method, url, params=None, **kwargs):
+        """
+        Sends the request over the connection pool, waiting on the rate limiter before each attempt
+        and retrying throttled, failed or dropped attempts according to the retry policy.
+        """
+        attempt = 0
+        instrumentation = self.instrumentation
+        kwargs.setdefault("timeout", _httpx_timeout(self.timeout))
+
+        while True:
+            if self.rate_limiter is not None:
+                wait = self.rate_limiter.reserve()
+                if wait > 0:
+                    await asyncio.sleep(wait)
+
+            try:
+                async with self._get_semaphore():
+                    if instrumentation is None:
+                        response = await self._http_request(
+                            method, url, params=params, **kwargs
+                        )
+                    else:
+                        # Stream the response to time the body transfer separately
+                        instrumentation.before_request(method, url, params)
+                        started = time.perf_counter()
+                        response = await self._http_request(
+                            method, url, params=params, stream=True, **kwargs
+                        )
+                        received = time.perf_counter()
+                        await response.aread()
+                        instrumentation.after_request(
+                            method,
+                            url,
+                            response,
+                            received - started,
+                            time.perf_counter() - received,
+                        )
+            except httpx.TransportError:
+                if self.retry_policy is None or not self.retry_policy.should_retry(
+                    method, attempt
+                ):
+                    raise
+                response = None
+            else:
+                if self.retry_policy is None or not self.retry_policy.should_retry(
+                    method, attempt, response
+                ):
+                    return response
+
+            await asyncio.sleep(self.retry_policy.get_backoff(attempt, response))
+            attempt += 1
+
+    async def _run_blocking(self, function, *args):
+        """
+        Runs a blocking function in the default executor so other coroutines keep running
+        Postal code lookups can load (or download) a country's pgeocode dataset on first use.
+        The caller's context is copied, so instrumentation spans opened by the function still nest.
+        """
+        context = contextvars.copy_context()
+        return await asyncio.get_running_loop().run_in_executor(
+            None, functools.partial(context.run, function, *args)
+        )
+
+    async def _http_request(self, method, url, stream=False, **kwargs):
+        """
+        Sends a single HTTP request over the transport if one is set, otherwise over the connection pool
+        Transports are synchronous, so they are called in the default executor.
+        """
+        if self.transport is not None:
+            response = await asyncio.get_running_loop().run_in_executor(
+                None,
+                functools.partial(
+                    self.transport.request,
+                    self.session,
+                    method,
+                    url,
+                    params=kwargs.get("params"),
+                    data=kwargs.get("content"),
+                    headers=kwargs.get("headers"),
+                    verify=self._ssl_verify,
+                    timeout=self.timeout,
+                ),
+            )
+            return _as_httpx_response(response, method, url)
+
+        if stream:
+            return await self.client.send(
+                self.client.build_request(method, url, **kwargs), stream=True
+            )
+        return await self.client.request(method, url, **kwargs)
+
+    @instrumented("request")
+    async def _request(self, method, url, params=None):
+        response = await self._send(method, url, params=params)
+
+        return self._process_response(response)
+
+    @instrumented("request")
+    async def _fetch_page(self, url, page_number, params):
+        """
+        Requests a single page and returns its records with the total number of pages
+        reported by the response headers (None if not reported)
+        """
+        page_params = {"params": dict(params["params"], page_number=page_number)}
+        response = await self._send("get", url, params=page_params)
+        records = self._process_response(response)
+        return records, self._total_pages(response, page_params["params"]["page_size"])
+
+    @instrumented("get_records")
+    async def _get_records(self, url, max_records=None, total_count=None, **params):
+        """
+        Returns the requested number of records.
+
+        This will only return the first (or specified #) page when number of records exceeds page size.
+        Pass max_records to override the instance setting for this call only.
+        """
+        if max_records is None:
+            max_records = self.max_records
+
+        requested_records = []
+        async for data in self._iter_pages(
+            url, max_records=max_records, total_count=total_count, **params
+        ):
+            requested_records.extend(data)
+
+        return requested_records[0:max_records]
+
+    @instrumented("get_all")
+    async def _get_all(self, url, total_count=None, **params):
+        """
+        Returns all the records as a single list
+        """
+        all_records = []
+        async for data in self._iter_pages(url, total_count=total_count, **params):
+            all_records.extend(data)
+
+        return all_records
+
+    async def _iter_pages(self, url, max_records=None, total_count=None, **params):
+        """
+        Asyncio counterpart of EC3Abstract._iter_pages, used by every get_* and iter_* method.
+        Pages are planned, stopped and de-duplicated the same way. Pages kept in flight are
+        asyncio tasks instead of threads, still limited by max_concurrency.
+
+        Args:
+            url (str): Api url
+            max_records (int, optional): Maximum number of records to return. Defaults to None (all records).
+            total_count (int, optional): Number of matching records if already known. Defaults to None.
+        """
+        page_size, page_params, first_page, last_page, cap_page = self._plan_pages(
+            max_records, total_count, params
+        )
+
+        # Pages kept in flight ahead of the one being processed
+        ahead = self.max_workers if self.max_workers > 1 else int(self.prefetch)
+
+        pending = deque([self._schedule_page(ahead, url, first_page, page_params)])
+        next_page = first_page + 1
+        received = 0
+        seen_ids = set()
+        try:
+            while pending:
+                page_number, task = pending.popleft()
+                try:
+                    if task is None:
+                        data, total_pages = await self._fetch_page(
+                            url, page_number, page_params
+                        )
+                    else:
+                        data, total_pages = await task
+                except httpx.HTTPStatusError as exc:
+                    if page_number == first_page or not self._is_past_last_page(exc):
+                        raise
+                    return
+
+                # The latest headers win, records may have moved since the first page
+                if total_pages is not None:
+                    last_page = (
+                        total_pages if cap_page is None else min(total_pages, cap_page)
+                    )
+                    while pending and pending[-1][0] > last_page:
+                        _discard_task(pending.pop()[1])
+
+                received += len(data)
+                finished = len(data) < page_size or (
+                    max_records is not None and received >= max_records
+                )
+
+                if not finished:
+                    while len(pending) < max(ahead, 1) and (
+                        last_page is None or next_page <= last_page
+                    ):
+                        pending.append(
+                            self._schedule_page(ahead, url, next_page, page_params)
+                        )
+                        next_page += 1
+
+                records = self._unseen_records(data, seen_ids)
+                if records:
+                    yield records
+
+                if finished:
+                    return
+        finally:
+            for _, task in pending:
+                _discard_task(task)
+
+    def _schedule_page(self, ahead, url, page_number, params):
+        """
+        Starts a page request as a task, or defers it when no pages are kept in flight
+        Tasks copy the caller's context, so instrumentation spans cover them.
+        """
+        if not ahead:
+            return page_number, None
+        task = asyncio.ensure_future(self._fetch_page(url, page_number, params))
+        return page_number, task
+
+    async def _iter_records(self, url, by_page=False, **params):
+        """
+        Yields all matching records (or whole pages if by_page is True) as they arrive
+        """
+        async for page in self._iter_pages(url, **params):
+            if by_page:
+                yield page
+            else:
+                for record in page:
+                    yield record
+
+    async def _get_category_tree(self):
+        """
+        Gets the entire categories tree over this client's connection pool
+        """
+        return await self._request("get", self.url.categories_tree_url())
+
+    async def _load_category_registry(self, force=False):
+        """
+        Downloads the categories tree into the shared category registry if it is missing or stale
+        """
+        if force or category_registry.is_stale():
+            category_registry.set_tree(await self._get_category_tree())
+        return category_registry
+
+
+class AsyncEC3Categories(AsyncEC3Abstract, EC3Categories):
+    """
+    Asyncio counterpart of EC3Categories
+
+    Usage:
+        >>> async with AsyncEC3Categories(bearer_token=token) as ec3_categories:
+        ...     category_tree = await ec3_categories.get_all_categories()
+    """
+
+    async def get_all_categories(self):
+        """
+        Gets the entire categories tree
+
+        Returns:
+            dict: Dictionary of entire category tree
+        """
+        return await self._get_category_tree()
+
+    async def get_category_by_id(self, category_id):
+        """
+        Returns the category from a category id
+
+        Args:
+            category_id (str): Category ID
+
+        Returns:
+            dict: Returns a category by ID with the whole sub-categories tree
+        """
+        return await self._request(
+            "get", self.url.categories_id_url().format(category_id=category_id)
+        )
+
+    async def get_category_registry(self, force=False):
+        """
+        Returns the shared category registry with its lookup indexes
+        The categories tree is only downloaded if it is missing or stale.
+
+        Args:
+            force (bool, optional): Set to True to download the tree even if it is fresh. Defaults to False.
+
+        Returns:
+            EC3CategoryRegistry: The shared category registry
+        """
+        return await self._load_category_registry(force=force)
+
+
+class AsyncEC3epds(AsyncEC3Abstract, EC3epds):
+    """
+    Asyncio counterpart of EC3epds
+
+    Usage:
+        >>> async with AsyncEC3epds(bearer_token=token, max_concurrency=20) as ec3_epds:
+        ...     epd_list = await asyncio.gather(
+        ...         *[ec3_epds.get_epd_by_xpduuid(uuid) for uuid in xpd_uuids]
+        ...     )
+    """
+
+    async def get_epds(self, return_all=False, total_count=None, **params):
+        """
+        Returns matching EPDs
+
+        Args:
+            return_all (bool, optional): Set to True to return all matches. Defaults to False, which will return the quantity specified in page_size.
+            total_count (int, optional): Number of matching records if already known (ex: from an earlier query). Lets paging stop without requesting an empty page. Defaults to None.
+
+        Returns:
+            list: List of dictionaries of matching EPD records
+        """
+        registry = None
+        if self.masterformat_filter or self.display_name_filter:
+            registry = await self._load_category_registry()
+
+        processed_params = self._process_params(params, registry)
+
+        if return_all:
+            return await self._get_all(
+                self.url.epds_url(), total_count=total_count, **processed_params
+            )
+        else:
+            return await self._get_records(
+                self.url.epds_url(), total_count=total_count, **processed_params
+            )
+
+    async def iter_epds(self, by_page=False, **params):
+        """
+        Yields all matching EPDs as each page arrives instead of returning a single list.
+        Only one page is held in memory at a time and breaking out of the loop stops further requests.
+
+        Usage:
+            >>> async for record in ec3_epds.iter_epds(params=epd_param_dict):
+            ...     process(record)
+
+        Args:
+            by_page (bool, optional): Set to True to yield each page as a list of records. Defaults to False, which yields one record at a time.
+
+        Yields:
+            dict: Matching EPD record (or list of records when by_page is True)
+        """
+        registry = None
+        if self.masterformat_filter or self.display_name_filter:
+            registry = await self._load_category_registry()
+
+        processed_params = self._process_params(params, registry)
+
+        async for record in self._iter_records(
+            self.url.epds_url(), by_page=by_page, **processed_params
+        ):
+            yield record
+
+    async def sync_epds(self, store, timestamp_field="updated_on", **params):
+        """
+        Fetches only EPDs changed since the last sync and merges them into a local store.
+        See EC3epds.sync_epds.
+
+        Args:
+            store (EC3LocalStore): Local store holding the records and the sync state
+            timestamp_field (str, optional): Field holding the last update time (ex: "updated_on" or "date_of_issue"). Defaults to "updated_on".
+
+        Returns:
+            int: Number of new or changed records merged into the store
+        """
+        params.setdefault("params", {})
+
+        high_water_mark = store.get_high_water_mark("epds")
+        if high_water_mark:
+            params["params"][timestamp_field + "__gte"] = high_water_mark
+        params["params"].setdefault("sort_by", timestamp_field)
+
+        return await store.amerge(
+            "epds",
+            self.iter_epds(by_page=True, **params),
+            timestamp_field=timestamp_field,
+        )
+
+    async def get_epd_by_xpduuid(self, epd_xpd_uuid):
+        """
+        Returns the epd from an Open xPD UUID
+
+        Args:
+            epd_xpd_uuid (str): Open xPD UUID (Example: EC300001)
+        Returns:
+            dict: Dictionary of the matching EPD record
+        """
+        return await self._request(
+            "get", self.url.epds_xpd_uuid_url().format(epd_xpd_uuid=epd_xpd_uuid)
+        )
+
+    async def get_epds_by_xpduuids(self, epd_xpd_uuids):
+        """
+        Returns the epds for many Open xPD UUIDs
+        Requests run concurrently up to max_concurrency. See EC3epds.get_epds_by_xpduuids.
+
+        Args:
+            epd_xpd_uuids (list): List of Open xPD UUIDs (Example: ["EC300001", "EC300002"])
+
+        Returns:
+            dict: Open xPD UUIDs as keys and the matching EPD record (or the exception raised for it) as values
+        """
+        results = {}
+        missing = []
+        for epd_xpd_uuid in dict.fromkeys(epd_xpd_uuids):
+            if self.xpd_uuid_cache is not None and epd_xpd_uuid in self.xpd_uuid_cache:
+                results[epd_xpd_uuid] = self.xpd_uuid_cache[epd_xpd_uuid]
+            else:
+                missing.append(epd_xpd_uuid)
+
+        records = await asyncio.gather(
+            *[self.get_epd_by_xpduuid(epd_xpd_uuid) for epd_xpd_uuid in missing],
+            return_exceptions=True,
+        )
+
+        for epd_xpd_uuid, record in zip(missing, records):
+            if isinstance(record, BaseException):
+                if not isinstance(record, (httpx.HTTPError, ValueError)):
+                    raise record
+            elif self.xpd_uuid_cache is not None:
+                self.xpd_uuid_cache[epd_xpd_uuid] = record
+            results[epd_xpd_uuid] = record
+
+        return {
+            epd_xpd_uuid: results[epd_xpd_uuid]
+            for epd_xpd_uuid in dict.fromkeys(epd_xpd_uuids)
+        }
+
+
+class AsyncEC3Materials(AsyncEC3Abstract, EC3Materials):
+    """
+    Asyncio counterpart of EC3Materials
+
+    Usage:
+        >>> async with AsyncEC3Materials(bearer_token=token) as ec3_materials:
+        ...     ec3_mat_list = await ec3_materials.get_materials(params=mat_param_dict)
+    """
+
+    async def get_materials(self, return_all=False, total_count=None, **params):
+        """
+        Returns matching materials
+
+        Args:
+            return_all (bool, optional): Set to True to return all matches. Defaults to False, which will return the quantity specified in max_records.
+            total_count (int, optional): Number of matching records if already known (ex: from an earlier query). Lets paging stop without requesting an empty page. Defaults to None.
+
+        Returns:
+            list: List of dictionaries of matching material records
+        """
+        if self.only_valid:
+            params["params"]["epd__date_validity_ends__gt"] = datetime.today().strftime(
+                "%Y-%m-%d"
+            )
+
+        registry = None
+        if self.masterformat_filter:
+            registry = await self._load_category_registry()
+
+        processed_params = self._process_params(params, registry)
+
+        if return_all:
+            return await self._get_all(
+                self.url.materials_url(), total_count=total_count, **processed_params
+            )
+        else:
+            return await self._get_records(
+                self.url.materials_url(), total_count=total_count, **processed_params
+            )
+
+    async def iter_materials(self, by_page=False, **params):
+        """
+        Yields all matching materials as each page arrives instead of returning a single list.
+        Only one page is held in memory at a time and breaking out of the loop stops further requests.
+
+        Usage:
+            >>> async for record in ec3_materials.iter_materials(params=mat_param_dict):
+            ...     process(record)
+
+        Args:
+            by_page (bool, optional): Set to True to yield each page as a list of records. Defaults to False, which yields one record at a time.
+
+        Yields:
+            dict: Matching material record (or list of records when by_page is True)
+        """
+        if self.only_valid:
+            params["params"]["epd__date_validity_ends__gt"] = datetime.today().strftime(
+                "%Y-%m-%d"
+            )
+
+        registry = None
+        if self.masterformat_filter:
+            registry = await self._load_category_registry()
+
+        processed_params = self._process_params(params, registry)
+
+        async for record in self._iter_records(
+            self.url.materials_url(), by_page=by_page, **processed_params
+        ):
+            yield record
+
+    async def sync_materials(self, store, timestamp_field="updated_on", **params):
+        """
+        Fetches only materials changed since the last sync and merges them into a local store.
+        See EC3Materials.sync_materials.
+
+        Args:
+            store (EC3LocalStore): Local store holding the records and the sync state
+            timestamp_field (str, optional): Field holding the last update time (ex: "updated_on" or "date_of_issue"). Defaults to "updated_on".
+
+        Returns:
+            int: Number of new or changed records merged into the store
+        """
+        params.setdefault("params", {})
+
+        high_water_mark = store.get_high_water_mark("materials")
+        if high_water_mark:
+            params["params"][timestamp_field + "__gte"] = high_water_mark
+        params["params"].setdefault("sort_by", timestamp_field)
+
+        return await store.amerge(
+            "materials",
+            self.iter_materials(by_page=True, **params),
+            timestamp_field=timestamp_field,
+        )
+
+    async def get_material_statistics(self, **params):
+        """
+        Returns GWP statistics computed by EC3 over all matching materials
+
+        Returns:
+            dict: Statistics of matching materials
+        """
+        registry = None
+        if self.masterformat_filter:
+            registry = await self._load_category_registry()
+
+        processed_params = self._process_statistics_params(params, registry)
+        return await self._request(
+            "get", self.url.material_statistics_url(), params=processed_params
+        )
+
+    async def get_cached_material_statistics(self, **params):
+        """
+        Returns the GWP statistics precomputed by EC3 for the matching category
+
+        Returns:
+            dict: Statistics of matching materials
+        """
+        registry = None
+        if self.masterformat_filter:
+            registry = await self._load_category_registry()
+
+        processed_params = self._process_statistics_params(params, registry)
+        return await self._request(
+            "get", self.url.material_statistics_cached_url(), params=processed_params
+        )
+
+    @instrumented("convert_query_to_mf_string")
+    async def convert_query_to_mf_string(
+        self, category_name, field_dict_list, pragma=None
+    ):
+        """
+        Converts a dictionary of material search parameters to a pragma string for use in the EC3 API
+        This function includes a POST request that requires an API key with write access
+
+        Args:
+            category_name (str): EC3 category name (see https://docs.open-epd-forum.org/en/data-format/materials/ for list of valid category names)
+            field_dict_list (list): List of dictionaries of search parameters (format: [{"field": "field_name", "op": "operator", "arg": "argument"}])
+            pragma (list, optional): List of dictionaries of pragma parameters. Defaults to eMF 2.0/1 and TRACI 2.1.
+
+        Returns:
+            httpx.Response: response containing the "material_filter_str"
+        """
+        if pragma is None:
+            pragma = DEFAULT_MF_PRAGMA
+
+        payload = json.dumps(
+            {"pragma": pragma, "category": category_name, "filter": field_dict_list}
+        )
+
+        mf_url = (
+            self.url.materials_convert_matfilter_url()
+            + "?output=string&output_style=compact"
+        )
+
+        return await self._send(
+            "post",
+            mf_url,
+            content=payload,
+            headers={"Content-Type": "application/json"},
+        )
+
+    async def compile_mf_string(self, category_name, field_dict_list, pragma=None):
+        """
+        Returns the MaterialFilter string for a filter, only calling convert_query_to_mf_string
+        when the same category, filters and pragma have not been compiled before.
+
+        Args:
+            category_name (str): EC3 category name (see https://docs.open-epd-forum.org/en/data-format/materials/ for list of valid category names)
+            field_dict_list (list): List of dictionaries of search parameters (format: [{"field": "field_name", "op": "operator", "arg": "argument"}])
+            pragma (list, optional): List of dictionaries of pragma parameters. Defaults to eMF 2.0/1 and TRACI 2.1.
+
+        Returns:
+            str: string formatted to work with MaterialFilter pragma in EC3 API
+        """
+        if pragma is None:
+            pragma = DEFAULT_MF_PRAGMA
+
+        if self.mf_cache is not None:
+            key = self.mf_cache.make_key(category_name, field_dict_list, pragma)
+            mf_string = self.mf_cache.get(key)
+            if mf_string is not None:
+                return mf_string
+
+        mf_response = await self.convert_query_to_mf_string(
+            category_name, field_dict_list, pragma=pragma
+        )
+        mf_string = self._process_response(mf_response)["material_filter_str"]
+
+        if self.mf_cache is not None:
+            self.mf_cache.set(key, mf_string)
+
+        return mf_string
+
+    async def compile_mf_strings(self, filter_variants):
+        """
+        Compiles many filters concurrently (limited by max_concurrency).
+
+        Args:
+            filter_variants (list): List of (category_name, field_dict_list) or (category_name, field_dict_list, pragma) tuples
+
+        Returns:
+            list: List of MaterialFilter strings in the same order as filter_variants
+        """
+        return list(
+            await asyncio.gather(*[self.compile_mf_string(*v) for v in filter_variants])
+        )
+
+    async def get_materials_mf(
+        self, category_name, mf_list, return_all=False, total_count=None, **params
+    ):
+        """
+        Returns matching materials using filters
+
+        Args:
+            category_name (str): Open EPD category name (see https://docs.open-epd-forum.org/en/data-format/materials/ for list of valid category names)
+            mf_list (list): List of dictionaries of search parameters (format: [{"field": "field_name", "op": "operator", "arg": "argument"}])
+            return_all (bool, optional): Set to True to return all matches. Defaults to False, which will return the quantity specified in max_records.
+            total_count (int, optional): Number of matching records if already known (ex: from an earlier query). Lets paging stop without requesting an empty page. Defaults to None.
+
+        Returns:
+            list: List of dictionaries of matching material records
+        """
+        if self.only_valid:
+            mf_list.append(
+                {
+                    "field": "epd__date_validity_ends",
+                    "op": "gt",
+                    "arg": datetime.today().strftime("%Y-%m-%d"),
+                }
+            )
+
+        mf_string = await self.compile_mf_string(category_name, mf_list)
+
+        params["params"] = {}
+        params["params"]["mf"] = mf_string
+
+        registry = None
+        if self.masterformat_filter:
+            registry = await self._load_category_registry()
+
+        processed_params = self._process_params(params, registry)
+
+        if return_all:
+            return await self._get_all(
+                self.url.materials_url(), total_count=total_count, **processed_params
+            )
+        else:
+            return await self._get_records(
+                self.url.materials_url(), total_count=total_count, **processed_params
+            )
+
+    async def get_materials_within_region(
+        self,
+        postal_code,
+        country_code="US",
+        plant_distance="100 mi",
+        return_all=False,
+        **params,
+    ):
+        """
+        Returns only materials from plants within provided distance of postal code.
+        This adds the "latitude", "longitude", and "plant_distance_lt" keys to your parameter dictionary.
+
+        Args:
+            postal_code (int): postal code
+            country_code (str, optional): Two letter country code.. Defaults to 'US'.
+            plant_distance (str, optional): Distance to plant with units in string ('mi' or 'km'). Defaults to "100 mi".
+            return_all (bool, optional): Set to True to return all matches. Defaults to False, which will return the quantity specified in max_records.
+
+        Returns:
+            list: List of dictionaries of matching material records within distance provided from postal code
+        """
+        with self._span("postal_to_latlong"):
+            lat, long = await self._run_blocking(
+                postal_to_latlong, postal_code, country_code
+            )
+        params["params"]["latitude"] = lat
+        params["params"]["longitude"] = long
+        params["params"]["plant__distance__lt"] = plant_distance
+
+        return await self.get_materials(return_all=return_all, **params)
+
+    async def get_materials_within_regions(
+        self,
+        locations,
+        country_code="US",
+        plant_distance="100 mi",
+        return_all=False,
+        **params,
+    ):
+        """
+        Returns materials from plants within provided distance of any of many sites, without duplicates.
+        Sites are queried concurrently (limited by max_concurrency). See EC3Materials.get_materials_within_regions.
+
+        Args:
+            locations (list): List of postal codes and/or (latitude, longitude) tuples
+            country_code (str, optional): Two letter country code for the postal codes. Defaults to 'US'.
+            plant_distance (str, optional): Distance to plant with units in string ('mi' or 'km'). Defaults to "100 mi".
+            return_all (bool, optional): Set to True to return all matches for each site. Defaults to False, which will return the quantity specified in max_records per site.
+
+        Returns:
+            list: List of dictionaries of unique matching material records with a "region_sites" key added
+        """
+        site_coords = await self._run_blocking(
+            self._resolve_sites, locations, country_code
+        )
+        base_params = params.get("params", {})
+
+        site_results = await asyncio.gather(
+            *[
+                self.get_materials(
+                    return_all=return_all,
+                    params=dict(
+                        base_params,
+                        latitude=coords[0],
+                        longitude=coords[1],
+                        plant__distance__lt=plant_distance,
+                    ),
+                )
+                for coords in site_coords
+            ]
+        )
+
+        return self._merge_site_results(site_results, site_coords, plant_distance)
+
+    async def get_materials_within_region_mf(
+        self,
+        category_name,
+        mf_list,
+        postal_code,
+        country_code="US",
+        plant_distance="100 mi",
+        return_all=False,
+        **params,
+    ):
+        """
+        Returns only materials from plants within provided distance of postal code.
+        This adds the "latitude", "longitude", and "plant_distance_lt" keys to your parameter dictionary.
+
+        Args:
+            category_name (str): Open EPD category name (see https://docs.open-epd-forum.org/en/data-format/materials/ for list of valid category names)
+            mf_list (list): List of dictionaries of search parameters (format: [{"field": "field_name", "op": "operator", "arg": "argument"}])
+            postal_code (int): postal code
+            country_code (str, optional): Two letter country code.. Defaults to 'US'.
+            plant_distance (str, optional): Distance to plant with units in string ('mi' or 'km'). Defaults to "100 mi".
+            return_all (bool, optional): Set to True to return all matches. Defaults to False, which will return the quantity specified in max_records.
+
+        Returns:
+            list: List of dictionaries of matching material records within distance provided from postal code
+        """
+        with self._span("postal_to_latlong"):
+            lat, long = await self._run_blocking(
+                postal_to_latlong, postal_code, country_code
+            )
+
+        mf_list.extend(
+            [
+                {"field": "latitude", "op": "exact", "arg": lat},
+                {"field": "longitude", "op": "exact", "arg": long},
+                {"field": "plant__distance", "op": "lt", "arg": plant_distance},
+            ]
+        )
+
+        return await self.get_materials_mf(
+            category_name, mf_list, return_all=return_all, **params
+        )
+
+
+class AsyncEC3Projects(AsyncEC3Abstract, EC3Projects):
+    """
+    Asyncio counterpart of EC3Projects
+
+    Usage:
+        >>> async with AsyncEC3Projects(bearer_token=token) as ec3_projects:
+        ...     ec3_project_list = await ec3_projects.get_projects(params=project_param_dict)
+    """
+
+    async def get_projects(self, return_all=False, total_count=None, **params):
+        """
+        Returns matching Projects in your EC3 account
+
+        Args:
+            return_all (bool, optional): Set to True to return all matches. Defaults to False, which will return the quantity specified in page_size.
+            total_count (int, optional): Number of matching records if already known (ex: from an earlier query). Lets paging stop without requesting an empty page. Defaults to None.
+
+        Returns:
+            list: List of dictionaries of matching Project records
+        """
+        processed_params = self._process_params(params)
+
+        if return_all:
+            return await self._get_all(
+                self.url.projects_url(), total_count=total_count, **processed_params
+            )
+        else:
+            return await self._get_records(
+                self.url.projects_url(), total_count=total_count, **processed_params
+            )
+
+    async def iter_projects(self, by_page=False, **params):
+        """
+        Yields all matching Projects as each page arrives instead of returning a single list.
+        Breaking out of the loop stops further requests.
+
+        Args:
+            by_page (bool, optional): Set to True to yield each page as a list of records. Defaults to False, which yields one record at a time.
+
+        Yields:
+            dict: Matching Project record (or list of records when by_page is True)
+        """
+        processed_params = self._process_params(params)
+
+        async for record in self._iter_records(
+            self.url.projects_url(), by_page=by_page, **processed_params
+        ):
+            yield record
+
+    async def get_project_by_id(self, project_id):
+        """
+        Returns the project from a project id
+
+        Args:
+            project_id (str): Entity ID
+
+        Returns:
+            list: List of dictionaries of matching Project records
+        """
+        return await self._request(
+            "get", self.url.projects_id_url().format(project_id=project_id)
+        )
+
+    async def get_projects_by_name(self, project_name):
+        """
+        Returns a list of projects with a name equivalent to the input
+        If your exact project name is put here you should get a list with one item.
+
+        Args:
+            project_name (str): Search term for your EC3 project name
+
+        Returns:
+            list: List of dictionaries of matching Project records
+        """
+        return await self._request(
+            "get", self.url.projects_name_url().format(project_name=project_name)
+        )
@@ -0,0 +1,386 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+import requests
+
+from .ec3_utils import normalize_params
+
+
+class EC3ResponseCache:
+    """
+    Persistent cache of EC3 Api GET responses stored in a local SQLite file
+
+    Responses are keyed on the method, url, normalized query params and bearer token.
+    Fresh entries are served without a request. Stale entries are revalidated with
+    If-None-Match / If-Modified-Since when the server provided an ETag or Last-Modified header.
+    Least recently used entries are evicted once the stored bodies exceed max_size bytes.
+
+    :ivar int default_ttl: Seconds a response stays fresh when no endpoint ttl matches, defaults to 3600
+    :ivar dict ttls: Seconds a response stays fresh per endpoint, matched against the url (ex: {"categories": 86400}), defaults to {}
+    :ivar int max_size: Maximum total size in bytes of stored response bodies, defaults to 100 MB
+    :ivar int hits: Number of requests served from a fresh cache entry
+    :ivar int revalidations: Number of stale entries confirmed unchanged by the server (HTTP 304)
+    :ivar int misses: Number of requests that downloaded a full response
+
+    Usage:
+        >>> ec3_materials = EC3Materials(bearer_token=token)
+        >>> ec3_materials.cache = EC3ResponseCache("ec3_cache.sqlite", ttls={"categories": 86400})
+        >>> ec3_materials.get_materials(params=mat_param_dict)
+        >>> ec3_materials.cache.stats()
+    """
+
+    def __init__(
+        self,
+        path="ec3_cache.sqlite",
+        default_ttl=3600,
+        ttls=None,
+        max_size=100 * 1024 * 1024,
+    ):
+        """
+        Args:
+            path (str, optional): Path to the SQLite file. Defaults to "ec3_cache.sqlite".
+            default_ttl (int, optional): Seconds a response stays fresh. Defaults to 3600.
+            ttls (dict, optional): Seconds a response stays fresh per endpoint. Defaults to None.
+            max_size (int, optional): Maximum total size in bytes of stored response bodies. Defaults to 100 MB.
+        """
+        self.default_ttl = default_ttl
+        self.ttls = ttls or {}
+        self.max_size = max_size
+
+        self.hits = 0
+        self.revalidations = 0
+        self.misses = 0
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                url TEXT,
+                headers TEXT,
+                body BLOB,
+                size INTEGER,
+                stored_at REAL,
+                accessed_at REAL
+            )
+            """)
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS responses_accessed_at ON responses (accessed_at)"
+        )
+        self._conn.commit()
+
+    def make_key(self, method, url, params=None, authorization=None):
+        """
+        Returns the cache key for a request
+
+        Args:
+            method (str): HTTP method
+            url (str): Request url
+            params (dict, optional): Query params. Defaults to None.
+            authorization (str, optional): Authorization header, so accounts do not share entries. Defaults to None.
+
+        Returns:
+            str: Hex digest identifying the request
+        """
+        key_material = json.dumps(
+            [method.upper(), url, normalize_params(params), authorization]
+        )
+        return hashlib.sha256(key_material.encode("utf-8")).hexdigest()
+
+    def ttl_for(self, url):
+        """
+        Returns the ttl in seconds for a url, using the longest matching endpoint in ttls
+        """
+        matches = [endpoint for endpoint in self.ttls if endpoint in url]
+        if matches:
+            return self.ttls[max(matches, key=len)]
+        return self.default_ttl
+
+    def send(self, send_request, method, url, params=None, authorization=None):
+        """
+        Sends a GET request through the cache
+
+        Args:
+            send_request (callable): Called as send_request(method, url, params=params, headers=headers) when the cache cannot answer the request
+            method (str): HTTP method
+            url (str): Request url
+            params (dict, optional): Query params. Defaults to None.
+            authorization (str, optional): Authorization header, so accounts do not share entries. Defaults to None.
+
+        Returns:
+            requests.models.Response: Cached or downloaded response
+        """
+        key, entry, cached, headers = self._lookup(method, url, params, authorization)
+        if cached is not None:
+            return cached
+
+        response = send_request(method, url, params=params, headers=headers)
+        return self._store(key, url, entry, response)
+
+    async def asend(self, send_request, method, url, params=None, authorization=None):
+        """
+        Sends a GET request through the cache from an asyncio client
+
+        Args:
+            send_request (coroutine function): Awaited as send_request(method, url, params=params, headers=headers) when the cache cannot answer the request
+            method (str): HTTP method
+            url (str): Request url
+            params (dict, optional): Query params. Defaults to None.
+            authorization (str, optional): Authorization header, so accounts do not share entries. Defaults to None.
+
+        Returns:
+            requests.models.Response | httpx.Response: Cached (requests) or downloaded (httpx) response
+        """
+        key, entry, cached, headers = self._lookup(method, url, params, authorization)
+        if cached is not None:
+            return cached
+
+        response = await send_request(method, url, params=params, headers=headers)
+        return self._store(key, url, entry, response)
+
+    def _lookup(self, method, url, params, authorization):
+        # Returns the key, the stored entry, the fresh cached response (if any)
+        # and the revalidation headers to send with the request
+        key = self.make_key(method, url, params, authorization)
+        entry = self._get(key)
+        if entry is None:
+            return key, None, None, None
+
+        cached_headers, body, stored_at = entry
+        if time.time() - stored_at < self.ttl_for(url):
+            self.hits += 1
+            return key, entry, self._build_response(url, cached_headers, body), None
+
+        headers = {}
+        if "ETag" in cached_headers:
+            headers["If-None-Match"] = cached_headers["ETag"]
+        if "Last-Modified" in cached_headers:
+            headers["If-Modified-Since"] = cached_headers["Last-Modified"]
+        return key, entry, None, headers or None
+
+    def _store(self, key, url, entry, response):
+        # Records the downloaded response and returns the response to use
+        if entry is not None and response.status_code == 304:
+            self.revalidations += 1
+            self._touch(key, refreshed=True)
+            return self._build_response(url, entry[0], entry[1])
+
+        self.misses += 1
+        if response.status_code == 200:
+            self._set(key, url, response)
+
+        return response
+
+    def stats(self):
+        """
+        Returns the hit/miss counters along with the number and size of stored entries
+
+        Returns:
+            dict: Cache statistics
+        """
+        with self._lock:
+            entries, size = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses"
+            ).fetchone()
+        return {
+            "hits": self.hits,
+            "revalidations": self.revalidations,
+            "misses": self.misses,
+            "entries": entries,
+            "size": size,
+        }
+
+    def clear(self):
+        """
+        Removes all stored responses and resets the counters
+        """
+        with self._lock:
+            self._conn.execute("DELETE FROM responses")
+            self._conn.commit()
+        self.hits = 0
+        self.revalidations = 0
+        self.misses = 0
+
+    def close(self):
+        """
+        Closes the SQLite connection
+        """
+        with self._lock:
+            self._conn.close()
+
+    def _get(self, key):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT headers, body, stored_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None:
+            return None
+        self._touch(key)
+        headers = requests.structures.CaseInsensitiveDict(json.loads(row[0]))
+        return headers, row[1], row[2]
+
+    def _touch(self, key, refreshed=False):
+        now = time.time()
+        with self._lock:
+            if refreshed:
+                self._conn.execute(
+                    "UPDATE responses SET accessed_at = ?, stored_at = ? WHERE key = ?",
+                    (now, now, key),
+                )
+            else:
+                self._conn.execute(
+                    "UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key)
+                )
+            self._conn.commit()
+
+    def _set(self, key, url, response):
+        body = response.content
+        if len(body) > self.max_size:
+            return
+
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (
+                    key,
+                    url,
+                    json.dumps(dict(response.headers)),
+                    body,
+                    len(body),
+                    now,
+                    now,
+                ),
+            )
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        # Drop least recently used entries until the stored bodies fit in max_size
+        total = self._conn.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM responses"
+        ).fetchone()[0]
+        if total <= self.max_size:
+            return
+
+        rows = self._conn.execute(
+            "SELECT key, size FROM responses ORDER BY accessed_at"
+        ).fetchall()
+        evicted = []
+        for key, size in rows:
+            if total <= self.max_size:
+                break
+            evicted.append((key,))
+            total -= size
+        self._conn.executemany("DELETE FROM responses WHERE key = ?", evicted)
+
+    def _build_response(self, url, headers, body):
+        response = requests.models.Response()
+        response.status_code = 200
+        response.url = url
+        response.headers = requests.structures.CaseInsensitiveDict(headers)
+        response._content = body
+        return response
+
+
+class EC3MaterialFilterCache:
+    """
+    Content-addressed cache of compiled MaterialFilter strings
+
+    Entries are keyed on the category name, the canonicalized filter list and the pragma,
+    so identical filters are only sent to materials/convert-query once.
+    Entries are kept in memory and, if a directory is given, also written to disk.
+    A shared in-memory instance is available as ec3.ec3_cache.mf_string_cache.
+
+    :ivar str directory: Optional directory where compiled strings are persisted, defaults to None
+    :ivar int hits: Number of lookups answered from the cache
+    :ivar int misses: Number of lookups that had to be compiled by the api
+    """
+
+    def __init__(self, directory=None):
+        """
+        Args:
+            directory (str, optional): Directory where compiled strings are persisted. Defaults to None.
+        """
+        self.directory = directory
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self.hits = 0
+        self.misses = 0
+
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def make_key(self, category_name, field_dict_list, pragma):
+        """
+        Returns the cache key for a filter
+
+        The order of the filters does not change the key.
+
+        Args:
+            category_name (str): EC3 category name
+            field_dict_list (list): List of dictionaries of search parameters
+            pragma (list): List of dictionaries of pragma parameters
+
+        Returns:
+            str: Hex digest identifying the filter
+        """
+        filters = sorted(
+            json.dumps(f, sort_keys=True, default=str) for f in field_dict_list
+        )
+        key_material = json.dumps(
+            [category_name, filters, pragma], sort_keys=True, default=str
+        )
+        return hashlib.sha256(key_material.encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        """
+        Returns the compiled string for a key (None if not cached)
+        """
+        with self._lock:
+            mf_string = self._entries.get(key)
+
+        if mf_string is None and self.directory:
+            path = os.path.join(self.directory, key + ".mf")
+            if os.path.exists(path):
+                with open(path, encoding="utf-8") as f:
+                    mf_string = f.read()
+                with self._lock:
+                    self._entries[key] = mf_string
+
+        if mf_string is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return mf_string
+
+    def set(self, key, mf_string):
+        """
+        Stores the compiled string for a key
+        """
+        with self._lock:
+            self._entries[key] = mf_string
+
+        if self.directory:
+            path = os.path.join(self.directory, key + ".mf")
+            tmp_path = "{}.{}.tmp".format(path, threading.get_ident())
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.write(mf_string)
+            os.replace(tmp_path, path)
+
+    def clear(self):
+        """
+        Removes all in-memory entries and resets the counters (files on disk are kept)
+        """
+        with self._lock:
+            self._entries.clear()
+        self.hits = 0
+        self.misses = 0
+
+
+mf_string_cache = EC3MaterialFilterCache()
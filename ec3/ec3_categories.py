@@ -1,5 +1,94 @@
+import threading
+import time
+
 from .ec3_api import EC3Abstract
 from .ec3_urls import EC3URLs
+from .ec3_utils import build_category_indexes
+
+
+class EC3CategoryRegistry:
+    """
+    Process-wide memoized copy of the EC3 categories tree with precomputed lookup indexes
+
+    The tree is downloaded once and reused by every client until it is older than ttl.
+    A shared instance is available as ec3.ec3_categories.category_registry.
+
+    :ivar int ttl: Seconds before the tree is downloaded again, defaults to 86400
+    :ivar dict tree: The entire categories tree (None until loaded)
+    :ivar dict masterformat_ids: Masterformat names as keys and category ids as values
+    :ivar dict display_name_ids: Display names as keys and category ids as values
+    :ivar dict nodes: Category ids as keys and category nodes as values
+    :ivar dict ancestors: Category ids as keys and tuples of ancestor ids (root first) as values
+    :ivar dict descendants: Category ids as keys and lists of all descendant ids as values
+    """
+
+    def __init__(self, ttl=86400):
+        self.ttl = ttl
+        self.tree = None
+        self.loaded_at = None
+
+        self.masterformat_ids = {}
+        self.display_name_ids = {}
+        self.nodes = {}
+        self.ancestors = {}
+        self.descendants = {}
+
+        self._lock = threading.RLock()
+
+    def is_stale(self):
+        """
+        Returns True if the tree has not been loaded or is older than ttl
+        """
+        return self.loaded_at is None or time.time() - self.loaded_at >= self.ttl
+
+    def load(self, fetch_tree, force=False):
+        """
+        Downloads the tree with fetch_tree if it is missing or stale
+
+        Args:
+            fetch_tree (callable): Function returning the entire categories tree
+            force (bool, optional): Set to True to download the tree even if it is fresh. Defaults to False.
+
+        Returns:
+            EC3CategoryRegistry: This registry
+        """
+        with self._lock:
+            if force or self.is_stale():
+                self.set_tree(fetch_tree())
+        return self
+
+    def set_tree(self, category_tree):
+        """
+        Stores the tree and rebuilds the lookup indexes
+
+        Args:
+            category_tree (dict): The entire categories tree
+        """
+        with self._lock:
+            indexes = build_category_indexes(category_tree)
+            self.masterformat_ids = indexes["masterformat_ids"]
+            self.display_name_ids = indexes["display_name_ids"]
+            self.nodes = indexes["nodes"]
+            self.ancestors = indexes["ancestors"]
+            self.descendants = indexes["descendants"]
+            self.tree = category_tree
+            self.loaded_at = time.time()
+
+    def clear(self):
+        """
+        Drops the stored tree so the next lookup downloads it again
+        """
+        with self._lock:
+            self.tree = None
+            self.loaded_at = None
+            self.masterformat_ids = {}
+            self.display_name_ids = {}
+            self.nodes = {}
+            self.ancestors = {}
+            self.descendants = {}
+
+
+category_registry = EC3CategoryRegistry()
 
 
 class EC3Categories(EC3Abstract):
@@ -11,9 +100,14 @@ class EC3Categories(EC3Abstract):
         >>> ec3_categories.get_all_categories()
     """
 
-    def __init__(self, bearer_token, response_format="json", ssl_verify=True):
+    def __init__(
+        self, bearer_token, response_format="json", ssl_verify=True, session=None
+    ):
         super().__init__(
-            bearer_token, response_format=response_format, ssl_verify=ssl_verify
+            bearer_token,
+            response_format=response_format,
+            ssl_verify=ssl_verify,
+            session=session,
         )
 
         self.url = EC3URLs(response_format=response_format)
@@ -40,3 +134,16 @@ class EC3Categories(EC3Abstract):
         return super()._request(
             "get", self.url.categories_id_url().format(category_id=category_id)
         )
+
+    def get_category_registry(self, force=False):
+        """
+        Returns the shared category registry with its lookup indexes
+        The categories tree is only downloaded if it is missing or stale.
+
+        Args:
+            force (bool, optional): Set to True to download the tree even if it is fresh. Defaults to False.
+
+        Returns:
+            EC3CategoryRegistry: The shared category registry
+        """
+        return self._load_category_registry(force=force)
@@ -0,0 +1,142 @@
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from .ec3_categories import EC3Categories
+from .ec3_epds import EC3epds
+from .ec3_materials import EC3Materials
+from .ec3_projects import EC3Projects
+
+
+class EC3Client:
+    """
+    Factory for EC3 service objects sharing a single connection pool
+
+    Every service object given out sends its requests over the same tuned requests.Session,
+    so connections (and TLS handshakes) are reused across materials, EPDs, projects and
+    categories, including the category lookups made while processing params.
+
+    :ivar requests.Session session: Session shared by every service object
+    :ivar float timeout: Seconds to wait for the server (or a (connect, read) tuple) applied to every service object, defaults to (10, 120)
+
+    Usage:
+        >>> with EC3Client(bearer_token=token, pool_maxsize=16) as ec3_client:
+        ...     ec3_materials = ec3_client.materials(max_workers=8)
+        ...     ec3_epds = ec3_client.epds(only_valid=False)
+        ...     ec3_mat_list = ec3_materials.get_materials(params=mat_param_dict)
+    """
+
+    def __init__(
+        self,
+        bearer_token,
+        response_format="json",
+        ssl_verify=True,
+        pool_connections=4,
+        pool_maxsize=16,
+        connect_retries=2,
+        timeout=(10, 120),
+    ):
+        """
+        Args:
+            bearer_token (str): EC3 bearer token for the user
+            response_format (str, optional): Defaults to "json".
+            ssl_verify (bool, optional): Defaults to True.
+            pool_connections (int, optional): Number of hosts to keep connection pools for. Defaults to 4.
+            pool_maxsize (int, optional): Maximum number of keep-alive connections per host. Should be at least max_workers of the service objects. Defaults to 16.
+            connect_retries (int, optional): Times a failed connection is retried by the adapter (ex: a dropped keep-alive connection). Throttled and failed responses are retried by the retry policy of each service object instead. Defaults to 2.
+            timeout (float | tuple, optional): Seconds to wait for the server, or a (connect, read) tuple. Defaults to (10, 120).
+        """
+        self.bearer_token = bearer_token
+        self.response_format = response_format
+        self.ssl_verify = ssl_verify
+        self.timeout = timeout
+
+        adapter = HTTPAdapter(
+            pool_connections=pool_connections,
+            pool_maxsize=pool_maxsize,
+            max_retries=Retry(
+                total=connect_retries,
+                connect=connect_retries,
+                read=0,
+                status=0,
+                redirect=False,
+                raise_on_status=False,
+            ),
+        )
+        self.session = requests.Session()
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers.update({"Authorization": "Bearer {}".format(bearer_token)})
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """
+        Closes the pooled connections
+        """
+        self.session.close()
+
+    def _create(self, service_class, attributes):
+        service = service_class(
+            self.bearer_token,
+            response_format=self.response_format,
+            ssl_verify=self.ssl_verify,
+            session=self.session,
+        )
+        service.timeout = self.timeout
+
+        for name, value in attributes.items():
+            if not hasattr(service, name):
+                raise AttributeError(
+                    "{} has no attribute '{}'".format(service_class.__name__, name)
+                )
+            setattr(service, name, value)
+        return service
+
+    def materials(self, **attributes):
+        """
+        Returns an EC3Materials object sharing this client's connection pool
+
+        Keyword arguments set attributes of the returned object (ex: max_records=500, max_workers=8).
+
+        Returns:
+            EC3Materials: Materials service object
+        """
+        return self._create(EC3Materials, attributes)
+
+    def epds(self, **attributes):
+        """
+        Returns an EC3epds object sharing this client's connection pool
+
+        Keyword arguments set attributes of the returned object (ex: only_valid=False).
+
+        Returns:
+            EC3epds: EPDs service object
+        """
+        return self._create(EC3epds, attributes)
+
+    def projects(self, **attributes):
+        """
+        Returns an EC3Projects object sharing this client's connection pool
+
+        Keyword arguments set attributes of the returned object.
+
+        Returns:
+            EC3Projects: Projects service object
+        """
+        return self._create(EC3Projects, attributes)
+
+    def categories(self, **attributes):
+        """
+        Returns an EC3Categories object sharing this client's connection pool
+
+        Keyword arguments set attributes of the returned object.
+
+        Returns:
+            EC3Categories: Categories service object
+        """
+        return self._create(EC3Categories, attributes)
@@ -1,29 +1,37 @@
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 
+import requests
+
 from .ec3_api import EC3Abstract
 from .ec3_urls import EC3URLs
-from .ec3_categories import EC3Categories
-from .ec3_utils import get_masterformat_category_dict, get_displayname_category_dict
+from .ec3_utils import projection_roots
 
 
 class EC3epds(EC3Abstract):
     """
     Wraps functionality of EC3 EPDs
 
-    :ivar list return_fields: List of the fields you would like returned (EC3 returns everything by default), defaults to []
+    :ivar list return_fields: List of the fields you would like returned, dotted paths select nested values (ex: ["gwp", "plant_or_group.latitude"]). EC3 returns everything by default, defaults to []
     :ivar str sort_by: Optional name of return field to sort results by, defaults to ""
     :ivar bool only_valid: If True will return only EPDs that are currently valid (set to False to also return expired EPDs), defaults to True
     :ivar list masterformat_filter: Optional list of Masterformat Category names to filter by (ex: ["03 21 00 Reinforcement Bars"]), defaults to []
     :ivar list display_name_filter: Optional list of Display Name Categories to filter by (ex: ["Ready Mix"]), defaults to []
+    :ivar dict xpd_uuid_cache: EPD records already resolved by get_epds_by_xpduuids, keyed by Open xPD UUID (set to None to disable), defaults to {}
 
     Usage:
         >>> ec3_epds = EC3epds(bearer_token=token, ssl_verify=False)
         >>> ec3_epd_list = ec3_epds.get_epds(params=epd_param_dict)
     """
 
-    def __init__(self, bearer_token, response_format="json", ssl_verify=True):
+    def __init__(
+        self, bearer_token, response_format="json", ssl_verify=True, session=None
+    ):
         super().__init__(
-            bearer_token, response_format=response_format, ssl_verify=ssl_verify
+            bearer_token,
+            response_format=response_format,
+            ssl_verify=ssl_verify,
+            session=session,
         )
 
         self.return_fields = []
@@ -34,14 +42,14 @@ class EC3epds(EC3Abstract):
             []
         )  # Currently EC3 requires you to go through category class for this
         self.display_name_filter = []
+        self.xpd_uuid_cache = {}
 
         self.url = EC3URLs(response_format=response_format)
 
-    def _process_params(self, params):
-        params["params"]["page_size"] = self.page_size
-
+    def _process_params(self, params, registry=None):
         if self.return_fields:
-            fields_string = ",".join(self.return_fields)
+            # The Api only selects top level fields, dotted paths are pruned from each page
+            fields_string = ",".join(projection_roots(self.return_fields))
             params["params"]["fields"] = fields_string
 
         # NOTE "sort_by" is not currently working as expected when passing multiple fields.
@@ -54,43 +62,98 @@ class EC3epds(EC3Abstract):
                 "%Y-%m-%d"
             )
 
+        # The registry is loaded by the caller, so the asyncio clients can await the download
         if self.masterformat_filter or self.display_name_filter:
-            ec3_categories = EC3Categories(
-                bearer_token=self.bearer_token, ssl_verify=False
-            )
-            self.category_tree = ec3_categories.get_all_categories()
+            self.category_tree = registry.tree
 
         if self.masterformat_filter:
-            masterformat_dict = get_masterformat_category_dict(self.category_tree)
-
-            category_ids = [masterformat_dict[i] for i in self.masterformat_filter]
+            category_ids = [
+                registry.masterformat_ids[i] for i in self.masterformat_filter
+            ]
             params["params"]["category"] = category_ids
 
         if self.display_name_filter:
-            display_name_dict = get_displayname_category_dict(self.category_tree)
-
-            category_ids = [display_name_dict[i] for i in self.display_name_filter]
+            category_ids = [
+                registry.display_name_ids[i] for i in self.display_name_filter
+            ]
             category_ids = list(set(category_ids))  # Remove duplicates
             params["params"]["category"] = category_ids
 
         return params
 
-    def get_epds(self, return_all=False, **params):
+    def get_epds(self, return_all=False, total_count=None, **params):
         """
         Returns matching EPDs
 
         Args:
             return_all (bool, optional): Set to True to return all matches. Defaults to False, which will return the quantity specified in page_size.
+            total_count (int, optional): Number of matching records if already known (ex: from an earlier query). Lets paging stop without requesting an empty page. Defaults to None.
 
         Returns:
             list: List of dictionaries of matching EPD records
         """
-        processed_params = self._process_params(params)
+        registry = None
+        if self.masterformat_filter or self.display_name_filter:
+            registry = self._load_category_registry()
+
+        processed_params = self._process_params(params, registry)
 
         if return_all:
-            return super()._get_all(self.url.epds_url(), **processed_params)
+            return super()._get_all(
+                self.url.epds_url(), total_count=total_count, **processed_params
+            )
         else:
-            return super()._get_records(self.url.epds_url(), **processed_params)
+            return super()._get_records(
+                self.url.epds_url(), total_count=total_count, **processed_params
+            )
+
+    def iter_epds(self, by_page=False, **params):
+        """
+        Yields all matching EPDs as each page arrives instead of returning a single list.
+        Only one page is held in memory at a time and breaking out of the loop stops further requests.
+
+        Args:
+            by_page (bool, optional): Set to True to yield each page as a list of records. Defaults to False, which yields one record at a time.
+
+        Yields:
+            dict: Matching EPD record (or list of records when by_page is True)
+        """
+        registry = None
+        if self.masterformat_filter or self.display_name_filter:
+            registry = self._load_category_registry()
+
+        processed_params = self._process_params(params, registry)
+
+        yield from super()._iter_records(
+            self.url.epds_url(), by_page=by_page, **processed_params
+        )
+
+    def sync_epds(self, store, timestamp_field="updated_on", **params):
+        """
+        Fetches only EPDs changed since the last sync and merges them into a local store.
+        The first sync fetches every match. Later syncs add a "<timestamp_field>__gte" filter
+        set to the newest timestamp seen so far, sorted by timestamp_field. Records at that exact
+        timestamp are fetched again, so records updated in the same instant as the last sync are not missed.
+
+        Args:
+            store (EC3LocalStore): Local store holding the records and the sync state
+            timestamp_field (str, optional): Field holding the last update time (ex: "updated_on" or "date_of_issue"). Defaults to "updated_on".
+
+        Returns:
+            int: Number of new or changed records merged into the store
+        """
+        params.setdefault("params", {})
+
+        high_water_mark = store.get_high_water_mark("epds")
+        if high_water_mark:
+            params["params"][timestamp_field + "__gte"] = high_water_mark
+        params["params"].setdefault("sort_by", timestamp_field)
+
+        return store.merge(
+            "epds",
+            self.iter_epds(by_page=True, **params),
+            timestamp_field=timestamp_field,
+        )
 
     def get_epd_by_xpduuid(self, epd_xpd_uuid):
         """
@@ -104,3 +167,48 @@ class EC3epds(EC3Abstract):
         return super()._request(
             "get", self.url.epds_xpd_uuid_url().format(epd_xpd_uuid=epd_xpd_uuid)
         )
+
+    def get_epds_by_xpduuids(self, epd_xpd_uuids, max_workers=8):
+        """
+        Returns the epds for many Open xPD UUIDs
+
+        Duplicate UUIDs are requested once and UUIDs already in xpd_uuid_cache are not requested again.
+        The rest are requested on a pool of max_workers threads sharing the session.
+        A failed lookup is returned as its exception instead of aborting the batch.
+
+        Args:
+            epd_xpd_uuids (list): List of Open xPD UUIDs (Example: ["EC300001", "EC300002"])
+            max_workers (int, optional): Maximum number of requests in flight at once. Defaults to 8.
+
+        Returns:
+            dict: Open xPD UUIDs as keys and the matching EPD record (or the exception raised for it) as values
+        """
+        results = {}
+        missing = []
+        for epd_xpd_uuid in dict.fromkeys(epd_xpd_uuids):
+            if self.xpd_uuid_cache is not None and epd_xpd_uuid in self.xpd_uuid_cache:
+                results[epd_xpd_uuid] = self.xpd_uuid_cache[epd_xpd_uuid]
+            else:
+                missing.append(epd_xpd_uuid)
+
+        if missing:
+            with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+                futures = {
+                    epd_xpd_uuid: executor.submit(self.get_epd_by_xpduuid, epd_xpd_uuid)
+                    for epd_xpd_uuid in missing
+                }
+                for epd_xpd_uuid, future in futures.items():
+                    try:
+                        record = future.result()
+                    except (requests.exceptions.RequestException, ValueError) as exc:
+                        results[epd_xpd_uuid] = exc
+                        continue
+
+                    results[epd_xpd_uuid] = record
+                    if self.xpd_uuid_cache is not None:
+                        self.xpd_uuid_cache[epd_xpd_uuid] = record
+
+        return {
+            epd_xpd_uuid: results[epd_xpd_uuid]
+            for epd_xpd_uuid in dict.fromkeys(epd_xpd_uuids)
+        }
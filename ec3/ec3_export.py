@@ -0,0 +1,231 @@
+from itertools import islice
+
+import pandas as pd
+
+from .ec3_models import EC3Model
+
+# Each schema entry is (column name, dotted path into the record, kind).
+# "quantity" columns hold unit strings such as "123 kgCO2e" and are split
+# into a numeric column and a "<column>_unit" column.
+MATERIAL_SCHEMA = [
+    ("id", "id", "string"),
+    ("open_xpd_uuid", "open_xpd_uuid", "string"),
+    ("name", "name", "string"),
+    ("category_id", "category.id", "string"),
+    ("category_name", "category.name", "string"),
+    ("category_display_name", "category.display_name", "string"),
+    ("declared_unit", "declared_unit", "quantity"),
+    ("gwp", "gwp", "quantity"),
+    ("gwp_per_kg", "gwp_per_kg", "quantity"),
+    ("manufacturer_name", "manufacturer.name", "string"),
+    ("plant_id", "plant_or_group.id", "string"),
+    ("plant_name", "plant_or_group.name", "string"),
+    ("plant_latitude", "plant_or_group.latitude", "float"),
+    ("plant_longitude", "plant_or_group.longitude", "float"),
+    ("date_validity_ends", "date_validity_ends", "date"),
+]
+
+EPD_SCHEMA = [
+    ("id", "id", "string"),
+    ("open_xpd_uuid", "open_xpd_uuid", "string"),
+    ("name", "name", "string"),
+    ("category_id", "category.id", "string"),
+    ("category_name", "category.name", "string"),
+    ("category_display_name", "category.display_name", "string"),
+    ("declared_unit", "declared_unit", "quantity"),
+    ("gwp", "gwp", "quantity"),
+    ("gwp_per_kg", "gwp_per_kg", "quantity"),
+    ("manufacturer_name", "manufacturer.name", "string"),
+    ("date_of_issue", "date_of_issue", "date"),
+    ("date_validity_ends", "date_validity_ends", "date"),
+]
+
+
+def _get_column(columns, records, path):
+    # Columns for each parent path are resolved once and reused by sibling fields
+    if path not in columns:
+        parent, _, key = path.rpartition(".")
+        parents = _get_column(columns, records, parent) if parent else records
+        columns[path] = [
+            value.get(key) if value.__class__ is dict else None for value in parents
+        ]
+    return columns[path]
+
+
+def records_to_columns(records, schema=MATERIAL_SCHEMA):
+    """
+    Flattens a list of nested records into raw columns following the schema
+
+    Args:
+        records (list): List of record dictionaries or ec3.ec3_models models (as returned by get_materials or get_epds)
+        schema (list, optional): List of (column name, dotted path, kind) tuples. Defaults to MATERIAL_SCHEMA.
+
+    Returns:
+        dict: Column names as keys and lists of raw values as values
+    """
+    records = [
+        record.to_dict() if isinstance(record, EC3Model) else record
+        for record in records
+    ]
+    columns_by_path = {}
+    return {
+        name: _get_column(columns_by_path, records, path) for name, path, _ in schema
+    }
+
+
+def parse_quantities(values):
+    """
+    Splits unit strings such as "123 kgCO2e" into numbers and units with vectorized string operations
+
+    Args:
+        values (list | pandas.Series): Unit strings (numbers are passed through with no unit)
+
+    Returns:
+        tuple: (pandas.Series of floats, pandas.Series of unit strings)
+    """
+    parts = (
+        pd.Series(values, dtype="object")
+        .astype("string")
+        .str.strip()
+        .str.split(n=1, expand=True)
+        .reindex(columns=[0, 1])
+    )
+    numbers = pd.to_numeric(parts[0], errors="coerce").astype("float64")
+    units = parts[1].astype("string").str.strip()
+    return numbers, units.where(units != "")
+
+
+def to_dataframe(records, schema=MATERIAL_SCHEMA):
+    """
+    Converts records to a pandas DataFrame with one column per schema entry
+
+    Quantity columns are parsed into a float column plus a "<column>_unit" column,
+    and date columns into UTC timestamps.
+
+    Args:
+        records (list): List of record dictionaries (as returned by get_materials or get_epds)
+        schema (list, optional): List of (column name, dotted path, kind) tuples. Defaults to MATERIAL_SCHEMA.
+
+    Returns:
+        pandas.DataFrame: Flattened records
+    """
+    records = list(records)
+    raw_columns = records_to_columns(records, schema)
+
+    data = {}
+    for name, _, kind in schema:
+        values = raw_columns[name]
+        if kind == "quantity":
+            data[name], data[name + "_unit"] = parse_quantities(values)
+        elif kind == "float":
+            data[name] = pd.to_numeric(
+                pd.Series(values, dtype="object"), errors="coerce"
+            ).astype("float64")
+        elif kind == "int":
+            data[name] = pd.to_numeric(
+                pd.Series(values, dtype="object"), errors="coerce"
+            ).astype("Int64")
+        elif kind == "bool":
+            data[name] = pd.Series(values, dtype="boolean")
+        elif kind == "date":
+            data[name] = pd.to_datetime(
+                pd.Series(values, dtype="object"), errors="coerce", utc=True
+            )
+        else:
+            data[name] = pd.Series(values, dtype="object").astype("string")
+
+    return pd.DataFrame(data)
+
+
+def arrow_schema(schema=MATERIAL_SCHEMA):
+    """
+    Returns the pyarrow schema matching the columns produced by to_dataframe
+    Requires the optional pyarrow dependency.
+
+    Args:
+        schema (list, optional): List of (column name, dotted path, kind) tuples. Defaults to MATERIAL_SCHEMA.
+
+    Returns:
+        pyarrow.Schema: Arrow schema
+    """
+    pa = _import_pyarrow()
+
+    arrow_types = {
+        "string": pa.string(),
+        "float": pa.float64(),
+        "int": pa.int64(),
+        "bool": pa.bool_(),
+        "date": pa.timestamp("us", tz="UTC"),
+    }
+    fields = []
+    for name, _, kind in schema:
+        if kind == "quantity":
+            fields.append(pa.field(name, pa.float64()))
+            fields.append(pa.field(name + "_unit", pa.string()))
+        else:
+            fields.append(pa.field(name, arrow_types[kind]))
+    return pa.schema(fields)
+
+
+def to_arrow(records, schema=MATERIAL_SCHEMA):
+    """
+    Converts records to a pyarrow Table with one column per schema entry
+    Requires the optional pyarrow dependency.
+
+    Args:
+        records (list): List of record dictionaries (as returned by get_materials or get_epds)
+        schema (list, optional): List of (column name, dotted path, kind) tuples. Defaults to MATERIAL_SCHEMA.
+
+    Returns:
+        pyarrow.Table: Flattened records
+    """
+    pa = _import_pyarrow()
+    return pa.Table.from_pandas(
+        to_dataframe(records, schema),
+        schema=arrow_schema(schema),
+        preserve_index=False,
+    )
+
+
+def to_parquet(records, path, schema=MATERIAL_SCHEMA, row_group_size=10000):
+    """
+    Writes records to a Parquet file one row group at a time
+    Records can be any iterable, including the iter_materials / iter_epds generators,
+    so only one row group is held in memory at once.
+    Requires the optional pyarrow dependency.
+
+    Args:
+        records (iterable): Record dictionaries (as returned by get_materials, get_epds, iter_materials or iter_epds)
+        path (str): Path of the Parquet file to write
+        schema (list, optional): List of (column name, dotted path, kind) tuples. Defaults to MATERIAL_SCHEMA.
+        row_group_size (int, optional): Number of records per row group. Defaults to 10000.
+
+    Returns:
+        int: Number of records written
+    """
+    _import_pyarrow()
+    import pyarrow.parquet as pq
+
+    records = iter(records)
+    written = 0
+
+    with pq.ParquetWriter(path, arrow_schema(schema)) as writer:
+        while True:
+            chunk = list(islice(records, row_group_size))
+            if not chunk:
+                break
+            writer.write_table(to_arrow(chunk, schema), row_group_size=row_group_size)
+            written += len(chunk)
+
+    return written
+
+
+def _import_pyarrow():
+    try:
+        import pyarrow
+    except ImportError:
+        raise ImportError(
+            "pyarrow is required for Arrow and Parquet export. "
+            "Install it with: pip install ec3-python-wrapper[export]"
+        )
+    return pyarrow
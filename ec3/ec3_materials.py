@@ -1,29 +1,48 @@
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 import json
 
 from .ec3_api import EC3Abstract
+from .ec3_cache import mf_string_cache
 from .ec3_urls import EC3URLs
-from .ec3_categories import EC3Categories
-from .ec3_utils import postal_to_latlong, get_masterformat_category_dict
+from .ec3_metrics import instrumented
+from .ec3_utils import (
+    distance_to_km,
+    haversine_km,
+    postal_to_latlong,
+    postal_to_latlong_batch,
+    projection_roots,
+)
+
+DEFAULT_MF_PRAGMA = [
+    {"name": "eMF", "args": ["2.0/1"]},
+    {"name": "lcia", "args": ["TRACI 2.1"]},
+]
 
 
 class EC3Materials(EC3Abstract):
     """
     Wraps functionality of EC3 Materials
 
-    :ivar list return_fields: List of the fields you would like returned (EC3 returns everything by default), defaults to []
+    :ivar list return_fields: List of the fields you would like returned, dotted paths select nested values (ex: ["gwp", "plant_or_group.latitude"]). EC3 returns everything by default, defaults to []
     :ivar str sort_by: Optional name of return field to sort results by, defaults to ""
     :ivar bool only_valid: If True will return only Materials with EPDs that are currently valid (set to False to also return materials with expired EPDs), defaults to True
     :ivar list masterformat_filter: Optional list of Masterformat Category names to filter by (ex: ["03 21 00 Reinforcement Bars"]), defaults to []
+    :ivar EC3MaterialFilterCache mf_cache: Cache of compiled MaterialFilter strings (set to None to disable), defaults to the shared ec3.ec3_cache.mf_string_cache
 
     Usage:
         >>> ec3_materials = EC3Materials(bearer_token=token, ssl_verify=False)
         >>> ec3_mat_list = ec3_materials.get_materials(params=mat_param_dict)
     """
 
-    def __init__(self, bearer_token, response_format="json", ssl_verify=True):
+    def __init__(
+        self, bearer_token, response_format="json", ssl_verify=True, session=None
+    ):
         super().__init__(
-            bearer_token, response_format=response_format, ssl_verify=ssl_verify
+            bearer_token,
+            response_format=response_format,
+            ssl_verify=ssl_verify,
+            session=session,
         )
 
         self.return_fields = []
@@ -32,41 +51,37 @@ class EC3Materials(EC3Abstract):
         self.masterformat_filter = (
             []
         )  # Currently EC3 requires you to go through category class for this
+        self.mf_cache = mf_string_cache
 
         self.url = EC3URLs(response_format=response_format)
 
-    def _process_params(self, params):
-        params["params"]["page_size"] = self.page_size
-
+    def _process_params(self, params, registry=None):
         if self.return_fields:
-            fields_string = ",".join(self.return_fields)
+            # The Api only selects top level fields, dotted paths are pruned from each page
+            fields_string = ",".join(projection_roots(self.return_fields))
             params["params"]["fields"] = fields_string
 
-            # FIXME seems like this is not return full dictionaries for nested values
-
         # NOTE "sort_by" is not currently working as expected when passing multiple fields.
         # Setting up to expect a single string field temporarily.
         if self.sort_by:
             params["params"]["sort_by"] = self.sort_by
 
+        # The registry is loaded by the caller, so the asyncio clients can await the download
         if self.masterformat_filter:
-            ec3_categories = EC3Categories(
-                bearer_token=self.bearer_token, ssl_verify=False
-            )
-            whole_tree = ec3_categories.get_all_categories()
-            masterformat_dict = get_masterformat_category_dict(whole_tree)
-
-            category_ids = [masterformat_dict[i] for i in self.masterformat_filter]
+            category_ids = [
+                registry.masterformat_ids[i] for i in self.masterformat_filter
+            ]
             params["params"]["category"] = category_ids
 
         return params
 
-    def get_materials(self, return_all=False, **params):
+    def get_materials(self, return_all=False, total_count=None, **params):
         """
         Returns matching materials
 
         Args:
             return_all (bool, optional): Set to True to return all matches. Defaults to False, which will return the quantity specified in max_records.
+            total_count (int, optional): Number of matching records if already known (ex: from an earlier query). Lets paging stop without requesting an empty page. Defaults to None.
 
         Returns:
             list: List of dictionaries of matching material records
@@ -76,13 +91,75 @@ class EC3Materials(EC3Abstract):
                 "%Y-%m-%d"
             )
 
-        processed_params = self._process_params(params)
+        registry = None
+        if self.masterformat_filter:
+            registry = self._load_category_registry()
+
+        processed_params = self._process_params(params, registry)
 
         if return_all:
-            return super()._get_all(self.url.materials_url(), **processed_params)
+            return super()._get_all(
+                self.url.materials_url(), total_count=total_count, **processed_params
+            )
         else:
-            return super()._get_records(self.url.materials_url(), **processed_params)
+            return super()._get_records(
+                self.url.materials_url(), total_count=total_count, **processed_params
+            )
+
+    def iter_materials(self, by_page=False, **params):
+        """
+        Yields all matching materials as each page arrives instead of returning a single list.
+        Only one page is held in memory at a time and breaking out of the loop stops further requests.
+
+        Args:
+            by_page (bool, optional): Set to True to yield each page as a list of records. Defaults to False, which yields one record at a time.
+
+        Yields:
+            dict: Matching material record (or list of records when by_page is True)
+        """
+        if self.only_valid:
+            params["params"]["epd__date_validity_ends__gt"] = datetime.today().strftime(
+                "%Y-%m-%d"
+            )
+
+        registry = None
+        if self.masterformat_filter:
+            registry = self._load_category_registry()
+
+        processed_params = self._process_params(params, registry)
+
+        yield from super()._iter_records(
+            self.url.materials_url(), by_page=by_page, **processed_params
+        )
+
+    def sync_materials(self, store, timestamp_field="updated_on", **params):
+        """
+        Fetches only materials changed since the last sync and merges them into a local store.
+        The first sync fetches every match. Later syncs add a "<timestamp_field>__gte" filter
+        set to the newest timestamp seen so far, sorted by timestamp_field. Records at that exact
+        timestamp are fetched again, so records updated in the same instant as the last sync are not missed.
+
+        Args:
+            store (EC3LocalStore): Local store holding the records and the sync state
+            timestamp_field (str, optional): Field holding the last update time (ex: "updated_on" or "date_of_issue"). Defaults to "updated_on".
+
+        Returns:
+            int: Number of new or changed records merged into the store
+        """
+        params.setdefault("params", {})
+
+        high_water_mark = store.get_high_water_mark("materials")
+        if high_water_mark:
+            params["params"][timestamp_field + "__gte"] = high_water_mark
+        params["params"].setdefault("sort_by", timestamp_field)
+
+        return store.merge(
+            "materials",
+            self.iter_materials(by_page=True, **params),
+            timestamp_field=timestamp_field,
+        )
 
+    @instrumented("convert_query_to_mf_string")
     def convert_query_to_mf_string(self, category_name, field_dict_list, pragma=None):
         """
         Converts a dictionary of material search parameters to a pragma string for use in the EC3 API
@@ -99,10 +176,7 @@ class EC3Materials(EC3Abstract):
         payload_dict = {}
 
         if pragma is None:
-            pragma = [
-                {"name": "eMF", "args": ["2.0/1"]},
-                {"name": "lcia", "args": ["TRACI 2.1"]},
-            ]
+            pragma = DEFAULT_MF_PRAGMA
 
         payload_dict["pragma"] = pragma
         payload_dict["category"] = category_name
@@ -119,13 +193,60 @@ class EC3Materials(EC3Abstract):
             "Content-Type": "application/json",
             "Authorization": f"Bearer {self.bearer_token}",
         }
-        response = self.session.request(
-            "post", mf_url, verify=self._ssl_verify, data=payload, headers=headers
+        # Goes through the rate limiter, request hooks and counters like every other request
+        return self._send_with_retries("post", mf_url, data=payload, headers=headers)
+
+    def compile_mf_string(self, category_name, field_dict_list, pragma=None):
+        """
+        Returns the MaterialFilter string for a filter, only calling convert_query_to_mf_string
+        when the same category, filters and pragma have not been compiled before.
+
+        Args:
+            category_name (str): EC3 category name (see https://docs.open-epd-forum.org/en/data-format/materials/ for list of valid category names)
+            field_dict_list (list): List of dictionaries of search parameters (format: [{"field": "field_name", "op": "operator", "arg": "argument"}])
+            pragma (list, optional): List of dictionaries of pragma parameters. Defaults to eMF 2.0/1 and TRACI 2.1.
+
+        Returns:
+            str: string formatted to work with MaterialFilter pragma in EC3 API
+        """
+        if pragma is None:
+            pragma = DEFAULT_MF_PRAGMA
+
+        if self.mf_cache is not None:
+            key = self.mf_cache.make_key(category_name, field_dict_list, pragma)
+            mf_string = self.mf_cache.get(key)
+            if mf_string is not None:
+                return mf_string
+
+        mf_response = self.convert_query_to_mf_string(
+            category_name, field_dict_list, pragma=pragma
         )
+        mf_string = self._process_response(mf_response)["material_filter_str"]
 
-        return response
+        if self.mf_cache is not None:
+            self.mf_cache.set(key, mf_string)
 
-    def get_materials_mf(self, category_name, mf_list, return_all=False, **params):
+        return mf_string
+
+    def compile_mf_strings(self, filter_variants, max_workers=4):
+        """
+        Compiles many filters concurrently. Filters compiled before are served from mf_cache.
+
+        Args:
+            filter_variants (list): List of (category_name, field_dict_list) or (category_name, field_dict_list, pragma) tuples
+            max_workers (int, optional): Number of filters compiled concurrently. Defaults to 4.
+
+        Returns:
+            list: List of MaterialFilter strings in the same order as filter_variants
+        """
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            return list(
+                executor.map(lambda v: self.compile_mf_string(*v), filter_variants)
+            )
+
+    def get_materials_mf(
+        self, category_name, mf_list, return_all=False, total_count=None, **params
+    ):
         """
         Returns matching materials using filters
 
@@ -133,6 +254,7 @@ class EC3Materials(EC3Abstract):
             category_name (str): Open EPD category name (see https://docs.open-epd-forum.org/en/data-format/materials/ for list of valid category names)
             mf_list (list): List of dictionaries of search parameters (format: [{"field": "field_name", "op": "operator", "arg": "argument"}])
             return_all (bool, optional): Set to True to return all matches. Defaults to False, which will return the quantity specified in max_records.
+            total_count (int, optional): Number of matching records if already known (ex: from an earlier query). Lets paging stop without requesting an empty page. Defaults to None.
 
         Returns:
             list: List of dictionaries of matching material records
@@ -146,19 +268,25 @@ class EC3Materials(EC3Abstract):
                 }
             )
 
-        mf_response = self.convert_query_to_mf_string(category_name, mf_list)
-        mf_response_json = mf_response.json()
-        mf_string = mf_response_json["material_filter_str"]
+        mf_string = self.compile_mf_string(category_name, mf_list)
 
         params["params"] = {}
         params["params"]["mf"] = mf_string
 
-        processed_params = self._process_params(params)
+        registry = None
+        if self.masterformat_filter:
+            registry = self._load_category_registry()
+
+        processed_params = self._process_params(params, registry)
 
         if return_all:
-            return super()._get_all(self.url.materials_url(), **processed_params)
+            return super()._get_all(
+                self.url.materials_url(), total_count=total_count, **processed_params
+            )
         else:
-            return super()._get_records(self.url.materials_url(), **processed_params)
+            return super()._get_records(
+                self.url.materials_url(), total_count=total_count, **processed_params
+            )
 
     def get_materials_within_region(
         self,
@@ -181,13 +309,138 @@ class EC3Materials(EC3Abstract):
         Returns:
             list: List of dictionaries of matching material records within distance provided from postal code
         """
-        lat, long = postal_to_latlong(postal_code, country_code)
+        with self._span("postal_to_latlong"):
+            lat, long = postal_to_latlong(postal_code, country_code)
         params["params"]["latitude"] = lat
         params["params"]["longitude"] = long
         params["params"]["plant__distance__lt"] = plant_distance
 
         return self.get_materials(return_all=return_all, **params)
 
+    def get_materials_within_regions(
+        self,
+        locations,
+        country_code="US",
+        plant_distance="100 mi",
+        return_all=False,
+        max_workers=4,
+        **params,
+    ):
+        """
+        Returns materials from plants within provided distance of any of many sites, without duplicates.
+        Each site is queried as in get_materials_within_region, with up to max_workers queries running at once.
+        The results are merged by material id and each record gets a "region_sites" key listing
+        the indexes (into locations) of every site within plant_distance of its plant, or whose query returned it.
+
+        Args:
+            locations (list): List of postal codes and/or (latitude, longitude) tuples
+            country_code (str, optional): Two letter country code for the postal codes. Defaults to 'US'.
+            plant_distance (str, optional): Distance to plant with units in string ('mi' or 'km'). Defaults to "100 mi".
+            return_all (bool, optional): Set to True to return all matches for each site. Defaults to False, which will return the quantity specified in max_records per site.
+            max_workers (int, optional): Number of sites queried concurrently. Defaults to 4.
+
+        Returns:
+            list: List of dictionaries of unique matching material records with a "region_sites" key added
+        """
+        site_coords = self._resolve_sites(locations, country_code)
+        base_params = params.get("params", {})
+
+        def query_site(coords):
+            site_params = dict(
+                base_params,
+                latitude=coords[0],
+                longitude=coords[1],
+                plant__distance__lt=plant_distance,
+            )
+            return self.get_materials(return_all=return_all, params=site_params)
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            site_results = list(executor.map(query_site, site_coords))
+
+        return self._merge_site_results(site_results, site_coords, plant_distance)
+
+    def _resolve_sites(self, locations, country_code):
+        """
+        Returns a (latitude, longitude) tuple for each location, looking up postal codes in one batch
+        """
+        site_coords = [None] * len(locations)
+        postal_indexes = []
+        for i, location in enumerate(locations):
+            if isinstance(location, (tuple, list)):
+                site_coords[i] = (float(location[0]), float(location[1]))
+            else:
+                postal_indexes.append(i)
+
+        with self._span("postal_to_latlong"):
+            resolved = postal_to_latlong_batch(
+                [locations[i] for i in postal_indexes], country_code
+            )
+        for i, coords in zip(postal_indexes, resolved):
+            site_coords[i] = coords
+
+        return site_coords
+
+    def _merge_site_results(self, site_results, site_coords, plant_distance):
+        """
+        Merges the records returned for each site by material id and adds their "region_sites" key
+        Records without an id cannot be matched across sites and are all kept.
+        """
+        # Record and the site indexes whose query returned it (dictionary keys keep them unique and in order)
+        materials = {}
+        unidentified = []
+        for site_index, records in enumerate(site_results):
+            for record in records:
+                material_id = record.get("id")
+                if material_id is None:
+                    unidentified.append((record, {site_index: None}))
+                else:
+                    _, returned_by = materials.setdefault(material_id, (record, {}))
+                    returned_by[site_index] = None
+
+        merged = list(materials.values()) + unidentified
+        records = [record for record, _ in merged]
+        memberships = self._sites_within_distance(
+            records, site_coords, distance_to_km(plant_distance)
+        )
+
+        for (record, returned_by), sites in zip(merged, memberships):
+            # Sites whose query returned the record always count, since the local distance can
+            # differ slightly from the server's at plant_distance. Records without plant
+            # coordinates (sites is None) only get those.
+            record["region_sites"] = sorted(set(returned_by).union(sites or ()))
+
+        return records
+
+    def _sites_within_distance(self, records, site_coords, max_km, chunk_size=10000):
+        """
+        Returns, for each record, the list of site indexes within max_km of its plant
+        (None when the record has no plant coordinates)
+        """
+        import numpy as np
+
+        plant_lats = np.full(len(records), np.nan)
+        plant_longs = np.full(len(records), np.nan)
+        for i, record in enumerate(records):
+            plant = record.get("plant_or_group") or {}
+            if plant.get("latitude") is not None and plant.get("longitude") is not None:
+                plant_lats[i] = plant["latitude"]
+                plant_longs[i] = plant["longitude"]
+
+        site_lats = np.array([c[0] for c in site_coords], dtype=float)
+        site_longs = np.array([c[1] for c in site_coords], dtype=float)
+
+        memberships = []
+        for start in range(0, len(records), chunk_size):
+            lats = plant_lats[start : start + chunk_size, np.newaxis]
+            longs = plant_longs[start : start + chunk_size, np.newaxis]
+            within = haversine_km(lats, longs, site_lats, site_longs) < max_km
+            has_coords = ~np.isnan(lats[:, 0])
+
+            for row, located in zip(within, has_coords):
+                memberships.append(np.flatnonzero(row).tolist() if located else None)
+
+        return memberships
+
     def get_materials_within_region_mf(
         self,
         category_name,
@@ -213,7 +466,8 @@ class EC3Materials(EC3Abstract):
         Returns:
             list: List of dictionaries of matching material records within distance provided from postal code
         """
-        lat, long = postal_to_latlong(postal_code, country_code)
+        with self._span("postal_to_latlong"):
+            lat, long = postal_to_latlong(postal_code, country_code)
 
         mf_list.extend(
             [
@@ -227,6 +481,55 @@ class EC3Materials(EC3Abstract):
             category_name, mf_list, return_all=return_all, **params
         )
 
+    def _process_statistics_params(self, params, registry=None):
+        params.setdefault("params", {})
+        if self.only_valid:
+            params["params"]["epd__date_validity_ends__gt"] = datetime.today().strftime(
+                "%Y-%m-%d"
+            )
+
+        processed_params = self._process_params(params, registry)
+
+        # Statistics are computed over every match, so paging and field selection do not apply
+        for key in ("page_size", "page_number", "fields"):
+            processed_params["params"].pop(key, None)
+        return processed_params
+
+    def get_material_statistics(self, **params):
+        """
+        Returns GWP statistics computed by EC3 over all matching materials
+        This avoids downloading every record when only the distribution is needed.
+        Use ec3.ec3_stats.gwp_statistics to compute the same figures from downloaded records.
+
+        Returns:
+            dict: Statistics of matching materials
+        """
+        registry = None
+        if self.masterformat_filter:
+            registry = self._load_category_registry()
+
+        processed_params = self._process_statistics_params(params, registry)
+        return self._request(
+            "get", self.url.material_statistics_url(), params=processed_params
+        )
+
+    def get_cached_material_statistics(self, **params):
+        """
+        Returns the GWP statistics precomputed by EC3 for the matching category
+        Faster than get_material_statistics but only refreshed periodically by EC3.
+
+        Returns:
+            dict: Statistics of matching materials
+        """
+        registry = None
+        if self.masterformat_filter:
+            registry = self._load_category_registry()
+
+        processed_params = self._process_statistics_params(params, registry)
+        return self._request(
+            "get", self.url.material_statistics_cached_url(), params=processed_params
+        )
+
     # NOTE Querying materials by "open_xpd_uuid" does not appear to currently work with the api
     # def get_material_by_xpduuid(self, epd_xpd_uuid):
     #     """
@@ -0,0 +1,284 @@
+from collections import deque
+from contextlib import contextmanager
+import contextvars
+import functools
+import inspect
+import itertools
+import threading
+import time
+
+TIMING_PHASES = ("connect", "transfer", "decode", "postprocess")
+COUNTERS = ("requests", "pages", "bytes", "records")
+
+# Spans open in the current thread or asyncio task, innermost last
+_open_spans = contextvars.ContextVar("ec3_open_spans", default=())
+_span_ids = itertools.count(1)
+
+
+class EC3Span:
+    """
+    Timed operation recorded by EC3Instrumentation
+
+    Timings (seconds) and counters of the requests made while the span was open are
+    accumulated in its attributes, so a get_materials span reports the totals of all its pages.
+
+    :ivar str name: Name of the operation (ex: "get_all")
+    :ivar int span_id: Unique id of the span
+    :ivar int parent_id: Id of the enclosing span (None for a top level span)
+    :ivar float start_time: Start time as seconds since the epoch
+    :ivar float duration: Seconds the span was open (None while open)
+    :ivar dict attributes: Timings, counters and request details
+    """
+
+    __slots__ = (
+        "name",
+        "span_id",
+        "parent_id",
+        "start_time",
+        "duration",
+        "attributes",
+        "_started",
+    )
+
+    def __init__(self, name, parent_id=None, attributes=None):
+        self.name = name
+        self.span_id = next(_span_ids)
+        self.parent_id = parent_id
+        self.start_time = time.time()
+        self.duration = None
+        self.attributes = dict(attributes or {})
+        self._started = time.perf_counter()
+
+    @property
+    def end_time(self):
+        """
+        End time as seconds since the epoch (None while open)
+        """
+        if self.duration is None:
+            return None
+        return self.start_time + self.duration
+
+    def to_dict(self):
+        """
+        Returns the span as a dictionary
+        """
+        return {
+            "name": self.name,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "start_time": self.start_time,
+            "end_time": self.end_time,
+            "duration": self.duration,
+            "attributes": dict(self.attributes),
+        }
+
+
+class EC3Instrumentation:
+    """
+    Collects timings, counters and spans of Api calls
+
+    Assign an instance to the instrumentation attribute of one or more clients to enable it.
+    Clients without one (the default) skip all of the bookkeeping.
+
+    Request time is split into phases:
+        - connect: from sending the request until the response headers arrive (connection and server time)
+        - transfer: reading the response body
+        - decode: json decoding and null removal
+        - postprocess: return_fields projection
+
+    :ivar list pre_request_hooks: Functions called with (method, url, params) before each HTTP request, defaults to []
+    :ivar list post_request_hooks: Functions called with (method, url, response, timings) after each HTTP response, defaults to []
+    :ivar callable exporter: Function called with each finished EC3Span (ex: OpenTelemetryExporter()), defaults to None
+    :ivar deque spans: Most recently finished spans (up to max_spans)
+    :ivar dict totals: Seconds spent in each phase and the number of requests, pages, bytes and records since the last reset
+
+    Usage:
+        >>> from ec3.ec3_metrics import EC3Instrumentation
+        >>> ec3_materials.instrumentation = EC3Instrumentation()
+        >>> ec3_materials.get_materials(return_all=True, params=mat_param_dict)
+        >>> ec3_materials.instrumentation.stats()
+    """
+
+    def __init__(self, exporter=None, max_spans=1000):
+        """
+        Args:
+            exporter (callable, optional): Function called with each finished EC3Span. Defaults to None.
+            max_spans (int, optional): Number of finished spans kept in spans. Defaults to 1000.
+        """
+        self.pre_request_hooks = []
+        self.post_request_hooks = []
+        self.exporter = exporter
+        self.spans = deque(maxlen=max_spans)
+
+        self._lock = threading.Lock()
+        self.reset()
+
+    @contextmanager
+    def span(self, name, **attributes):
+        """
+        Context manager recording a span around a block of code
+
+        Args:
+            name (str): Name of the operation
+
+        Yields:
+            EC3Span: The open span
+        """
+        parents = _open_spans.get()
+        span = EC3Span(
+            name,
+            parent_id=parents[-1].span_id if parents else None,
+            attributes=attributes,
+        )
+        token = _open_spans.set(parents + (span,))
+        try:
+            yield span
+        except BaseException as exc:
+            span.attributes["error"] = repr(exc)
+            raise
+        finally:
+            _open_spans.reset(token)
+            span.duration = time.perf_counter() - span._started
+            self.spans.append(span)
+            if self.exporter is not None:
+                self.exporter(span)
+
+    def add(self, name, value):
+        """
+        Adds to a timing or counter, both in the totals and in every open span
+
+        Args:
+            name (str): Phase or counter name (ex: "decode" or "bytes")
+            value (float): Seconds or count to add
+        """
+        with self._lock:
+            self.totals[name] = self.totals.get(name, 0) + value
+        for span in _open_spans.get():
+            span.attributes[name] = span.attributes.get(name, 0) + value
+
+    def before_request(self, method, url, params=None):
+        """
+        Runs the pre-request hooks
+        """
+        for hook in self.pre_request_hooks:
+            hook(method, url, params)
+
+    def after_request(self, method, url, response, connect, transfer):
+        """
+        Records a completed HTTP request and runs the post-request hooks
+
+        Args:
+            method (str): HTTP method
+            url (str): Requested url
+            response: Response received
+            connect (float): Seconds until the response headers arrived
+            transfer (float): Seconds spent reading the response body
+        """
+        self.add("requests", 1)
+        self.add("bytes", len(response.content))
+        self.add("connect", connect)
+        self.add("transfer", transfer)
+
+        spans = _open_spans.get()
+        if spans:
+            spans[-1].attributes["http.method"] = method.upper()
+            spans[-1].attributes["http.url"] = url
+            spans[-1].attributes["http.status_code"] = response.status_code
+
+        timings = {"connect": connect, "transfer": transfer}
+        for hook in self.post_request_hooks:
+            hook(method, url, response, timings)
+
+    def stats(self):
+        """
+        Returns the totals since the last reset
+
+        Returns:
+            dict: Seconds per phase and number of requests, pages, bytes and records
+        """
+        with self._lock:
+            return dict(self.totals)
+
+    def reset(self):
+        """
+        Clears the totals and the recorded spans
+        """
+        with self._lock:
+            self.totals = dict.fromkeys(TIMING_PHASES, 0.0)
+            self.totals.update(dict.fromkeys(COUNTERS, 0))
+        self.spans.clear()
+
+
+class OpenTelemetryExporter:
+    """
+    Exports finished spans to an OpenTelemetry tracer
+    Requires the optional opentelemetry-api dependency.
+
+    Spans are exported as they finish, so they are not nested in the trace.
+    The ec3.span_id and ec3.parent_id attributes keep the link between them.
+
+    Usage:
+        >>> from ec3.ec3_metrics import EC3Instrumentation, OpenTelemetryExporter
+        >>> ec3_epds.instrumentation = EC3Instrumentation(exporter=OpenTelemetryExporter())
+    """
+
+    def __init__(self, tracer=None):
+        """
+        Args:
+            tracer (opentelemetry.trace.Tracer, optional): Tracer to export to. Defaults to the tracer of the global provider.
+        """
+        if tracer is None:
+            try:
+                from opentelemetry import trace
+            except ImportError:
+                raise ImportError(
+                    "opentelemetry-api is required for the OpenTelemetry exporter. "
+                    "Install it with: pip install opentelemetry-api"
+                )
+            tracer = trace.get_tracer("ec3")
+        self.tracer = tracer
+
+    def __call__(self, span):
+        attributes = dict(span.attributes, **{"ec3.span_id": span.span_id})
+        if span.parent_id is not None:
+            attributes["ec3.parent_id"] = span.parent_id
+
+        otel_span = self.tracer.start_span(
+            "ec3." + span.name,
+            start_time=int(span.start_time * 1e9),
+            attributes=attributes,
+        )
+        otel_span.end(end_time=int(span.end_time * 1e9))
+
+
+def instrumented(name):
+    """
+    Decorator recording a span around a client method when the client has instrumentation set
+    Coroutine methods are supported. Without instrumentation the method is called directly.
+
+    Args:
+        name (str): Name of the span
+    """
+
+    def decorator(method):
+        if inspect.iscoroutinefunction(method):
+
+            @functools.wraps(method)
+            async def async_wrapper(self, *args, **kwargs):
+                if self.instrumentation is None:
+                    return await method(self, *args, **kwargs)
+                with self.instrumentation.span(name):
+                    return await method(self, *args, **kwargs)
+
+            return async_wrapper
+
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            if self.instrumentation is None:
+                return method(self, *args, **kwargs)
+            with self.instrumentation.span(name):
+                return method(self, *args, **kwargs)
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,251 @@
+import json
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+
+def _dumps(record):
+    if orjson is not None:
+        # orjson returns an over-allocated buffer, copy it to hold only the bytes written
+        return bytes(memoryview(orjson.dumps(record)))
+    return json.dumps(record, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+
+def _loads(raw):
+    if orjson is not None:
+        return orjson.loads(raw)
+    return json.loads(raw)
+
+
+class EC3Model:
+    """
+    Compact, read-mostly view of a single EC3 record
+
+    The frequently used fields listed in eager_fields are decoded once into slots.
+    The rest of the record is kept as compact json bytes and only parsed when another field is accessed,
+    so holding tens of thousands of records takes a fraction of the memory of nested dictionaries.
+
+    Records can be read like dictionaries (record["gwp"], record.get("plant_or_group"))
+    or through attributes (record.gwp, record.category_id). Fields that are not eager are parsed
+    from the bytes on every access and not kept, so use to_dict() when reading many of them.
+
+    Usage:
+        >>> from ec3.ec3_models import Material
+        >>> ec3_materials.result_model = Material
+        >>> ec3_mat_list = ec3_materials.get_materials(return_all=True, params=mat_param_dict)
+        >>> min(ec3_mat_list, key=lambda m: float(m.gwp.split()[0])).to_dict()
+
+    gwp is kept as the string EC3 returns (ex: "245.1 kgCO2e"). Compare the parsed numbers only
+    when the records share a declared unit, or use ec3.ec3_stats.normalize_gwp to convert units first.
+    """
+
+    __slots__ = ("_raw",)
+
+    # (attribute name, path into the record) of the fields decoded eagerly
+    eager_fields = ()
+
+    # Top level record keys of the eager fields and their attribute names
+    _top_level = {}
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._top_level = {
+            path[0]: name for name, path in cls.eager_fields if len(path) == 1
+        }
+
+    def __init__(self, record):
+        """
+        Args:
+            record (dict): Decoded record
+        """
+        self._load(record)
+
+    def _load(self, record):
+        for name, path in self.eager_fields:
+            value = record
+            for key in path:
+                value = value.get(key) if value.__class__ is dict else None
+            setattr(self, name, value)
+
+        # Top level eager fields are not repeated in the bytes (nulls are kept to tell them from missing fields)
+        top_level = self._top_level
+        self._raw = _dumps(
+            {
+                key: value
+                for key, value in record.items()
+                if value is None or key not in top_level
+            }
+        )
+
+    @classmethod
+    def from_records(cls, records):
+        """
+        Returns a model for each record
+
+        Args:
+            records (list): List of record dictionaries
+
+        Returns:
+            list: List of models
+        """
+        return [cls(record) for record in records]
+
+    def to_dict(self):
+        """
+        Returns the full record as a new dictionary
+
+        Returns:
+            dict: Decoded record
+        """
+        record = {}
+        for key, name in self._top_level.items():
+            value = getattr(self, name)
+            if value is not None:
+                record[key] = value
+        record.update(_loads(self._raw))
+        return record
+
+    def get(self, key, default=None):
+        """
+        Returns a top level field of the record, or default if it is missing
+        """
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def keys(self):
+        """
+        Returns the top level field names of the record
+        """
+        return self.to_dict().keys()
+
+    def __getitem__(self, key):
+        name = self._top_level.get(key)
+        if name is not None:
+            value = getattr(self, name)
+            if value is not None:
+                return value
+        return _loads(self._raw)[key]
+
+    def __setitem__(self, key, value):
+        record = self.to_dict()
+        record[key] = value
+        self._load(record)
+
+    def __contains__(self, key):
+        return key in self.to_dict()
+
+    def __iter__(self):
+        return iter(self.to_dict())
+
+    def __len__(self):
+        return len(self.to_dict())
+
+    def __getattr__(self, name):
+        # Only called for names that are not eager fields
+        if name.startswith("_"):
+            raise AttributeError(name)
+        try:
+            return _loads(self._raw)[name]
+        except KeyError:
+            raise AttributeError(
+                "{} has no field '{}'".format(self.__class__.__name__, name)
+            )
+
+    def __eq__(self, other):
+        if other.__class__ is not self.__class__:
+            return NotImplemented
+        return self.to_dict() == other.to_dict()
+
+    # Mutable like the dictionaries they replace
+    __hash__ = None
+
+    def __getstate__(self):
+        return (
+            tuple(getattr(self, name) for name, _ in self.eager_fields),
+            self._raw,
+        )
+
+    def __setstate__(self, state):
+        values, self._raw = state
+        for (name, _), value in zip(self.eager_fields, values):
+            setattr(self, name, value)
+
+    def __repr__(self):
+        return "{}(id={!r}, name={!r})".format(
+            self.__class__.__name__, getattr(self, "id", None), self.get("name")
+        )
+
+
+class Material(EC3Model):
+    """
+    Material record with id, open_xpd_uuid, name, gwp, declared_unit, category_id,
+    latitude, longitude (of the plant) and date_validity_ends decoded eagerly
+    """
+
+    eager_fields = (
+        ("id", ("id",)),
+        ("open_xpd_uuid", ("open_xpd_uuid",)),
+        ("name", ("name",)),
+        ("gwp", ("gwp",)),
+        ("declared_unit", ("declared_unit",)),
+        ("category_id", ("category", "id")),
+        ("latitude", ("plant_or_group", "latitude")),
+        ("longitude", ("plant_or_group", "longitude")),
+        ("date_validity_ends", ("date_validity_ends",)),
+    )
+    __slots__ = tuple(name for name, _ in eager_fields)
+
+
+class EPD(EC3Model):
+    """
+    EPD record with id, open_xpd_uuid, name, gwp, declared_unit, category_id,
+    latitude, longitude (of the plant), date_of_issue and date_validity_ends decoded eagerly
+    """
+
+    eager_fields = (
+        ("id", ("id",)),
+        ("open_xpd_uuid", ("open_xpd_uuid",)),
+        ("name", ("name",)),
+        ("gwp", ("gwp",)),
+        ("declared_unit", ("declared_unit",)),
+        ("category_id", ("category", "id")),
+        ("latitude", ("plant_or_group", "latitude")),
+        ("longitude", ("plant_or_group", "longitude")),
+        ("date_of_issue", ("date_of_issue",)),
+        ("date_validity_ends", ("date_validity_ends",)),
+    )
+    __slots__ = tuple(name for name, _ in eager_fields)
+
+
+class Project(EC3Model):
+    """
+    Project record with id, name, created_on and updated_on decoded eagerly
+    """
+
+    eager_fields = (
+        ("id", ("id",)),
+        ("name", ("name",)),
+        ("created_on", ("created_on",)),
+        ("updated_on", ("updated_on",)),
+    )
+    __slots__ = tuple(name for name, _ in eager_fields)
+
+
+class Category(EC3Model):
+    """
+    Category record with id, name, display_name, masterformat and declared_unit decoded eagerly
+    Subcategories stay in the raw bytes.
+    """
+
+    eager_fields = (
+        ("id", ("id",)),
+        ("name", ("name",)),
+        ("display_name", ("display_name",)),
+        ("masterformat", ("masterformat",)),
+        ("declared_unit", ("declared_unit",)),
+    )
+    __slots__ = tuple(name for name, _ in eager_fields)
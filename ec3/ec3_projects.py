@@ -13,9 +13,14 @@ class EC3Projects(EC3Abstract):
         >>> ec3_project_list.get_projects(params=project_param_dict)
     """
 
-    def __init__(self, bearer_token, response_format="json", ssl_verify=True):
+    def __init__(
+        self, bearer_token, response_format="json", ssl_verify=True, session=None
+    ):
         super().__init__(
-            bearer_token, response_format=response_format, ssl_verify=ssl_verify
+            bearer_token,
+            response_format=response_format,
+            ssl_verify=ssl_verify,
+            session=session,
         )
 
         self.sort_by = ""
@@ -23,8 +28,6 @@ class EC3Projects(EC3Abstract):
         self.url = EC3URLs(response_format=response_format)
 
     def _process_params(self, params):
-        params["params"]["page_size"] = self.page_size
-
         # NOTE "sort_by" is not currently working as expected when passing multiple fields.
         # Setting up to expect a single string field temporarily.
         if self.sort_by:
@@ -32,12 +35,13 @@ class EC3Projects(EC3Abstract):
 
         return params
 
-    def get_projects(self, return_all=False, **params):
+    def get_projects(self, return_all=False, total_count=None, **params):
         """
         Returns matching Projects in your EC3 account
 
         Args:
             return_all (bool, optional): Set to True to return all matches. Defaults to False, which will return the quantity specified in page_size.
+            total_count (int, optional): Number of matching records if already known (ex: from an earlier query). Lets paging stop without requesting an empty page. Defaults to None.
 
         Returns:
             list: List of dictionaries of matching Project records
@@ -45,9 +49,30 @@ class EC3Projects(EC3Abstract):
         processed_params = self._process_params(params)
 
         if return_all:
-            return super()._get_all(self.url.projects_url(), **processed_params)
+            return super()._get_all(
+                self.url.projects_url(), total_count=total_count, **processed_params
+            )
         else:
-            return super()._get_records(self.url.projects_url(), **processed_params)
+            return super()._get_records(
+                self.url.projects_url(), total_count=total_count, **processed_params
+            )
+
+    def iter_projects(self, by_page=False, **params):
+        """
+        Yields all matching Projects as each page arrives instead of returning a single list.
+        Breaking out of the loop stops further requests.
+
+        Args:
+            by_page (bool, optional): Set to True to yield each page as a list of records. Defaults to False, which yields one record at a time.
+
+        Yields:
+            dict: Matching Project record (or list of records when by_page is True)
+        """
+        processed_params = self._process_params(params)
+
+        yield from super()._iter_records(
+            self.url.projects_url(), by_page=by_page, **processed_params
+        )
 
     def get_project_by_id(self, project_id):
         """
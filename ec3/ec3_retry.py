@@ -0,0 +1,193 @@
+from email.utils import parsedate_to_datetime
+from datetime import datetime, timezone
+import random
+import threading
+import time
+
+
+class EC3RateLimiter:
+    """
+    Client-side token bucket shared by every client in the process
+
+    Each request takes one token. Tokens refill at rate per second up to burst,
+    so concurrent pulls stay under the Api quota instead of being throttled by the server.
+    A shared instance is available as ec3.ec3_retry.rate_limiter (disabled until a rate is set).
+
+    :ivar float rate: Requests allowed per second (None to disable), defaults to None
+    :ivar int burst: Maximum number of requests that can be sent at once after an idle period, defaults to 10
+    :ivar int waits: Number of requests that had to wait for a token
+    :ivar float wait_time: Total seconds spent waiting for tokens
+
+    Usage:
+        >>> from ec3.ec3_retry import rate_limiter
+        >>> rate_limiter.configure(rate=5, burst=10)
+    """
+
+    def __init__(self, rate=None, burst=10):
+        self.rate = rate
+        self.burst = burst
+
+        self.waits = 0
+        self.wait_time = 0.0
+
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def configure(self, rate=None, burst=10):
+        """
+        Changes the rate and burst size and refills the bucket
+
+        Args:
+            rate (float, optional): Requests allowed per second (None to disable). Defaults to None.
+            burst (int, optional): Maximum number of requests sent at once. Defaults to 10.
+        """
+        with self._lock:
+            self.rate = rate
+            self.burst = burst
+            self._tokens = float(burst)
+            self._updated = time.monotonic()
+
+    def reserve(self):
+        """
+        Takes a token and returns how many seconds the caller must wait before sending
+
+        Returns:
+            float: Seconds to wait (0 if a token was available)
+        """
+        if self.rate is None:
+            return 0.0
+
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(
+                self.burst, self._tokens + (now - self._updated) * self.rate
+            )
+            self._updated = now
+            self._tokens -= 1
+
+            wait = 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+            if wait > 0:
+                self.waits += 1
+                self.wait_time += wait
+
+        return wait
+
+    def acquire(self):
+        """
+        Blocks until a token is available
+        """
+        wait = self.reserve()
+        if wait > 0:
+            time.sleep(wait)
+
+    def stats(self):
+        """
+        Returns the throttle counters
+
+        Returns:
+            dict: Number of waits and total seconds waited
+        """
+        return {"waits": self.waits, "wait_time": self.wait_time}
+
+
+class EC3RetryPolicy:
+    """
+    Retry engine with exponential backoff, full jitter and Retry-After support
+
+    A shared instance is used by every client by default and is available as ec3.ec3_retry.retry_policy.
+
+    :ivar int max_retries: Maximum number of retries per request (0 to disable), defaults to 3
+    :ivar float backoff_factor: Base delay in seconds, doubled on every retry, defaults to 0.5
+    :ivar float max_backoff: Maximum delay in seconds between retries (Retry-After is always honored), defaults to 30
+    :ivar frozenset status_forcelist: Status codes that are retried, defaults to 429, 500, 502, 503 and 504
+    :ivar frozenset allowed_methods: HTTP methods that are retried, defaults to GET, HEAD and OPTIONS
+    :ivar int retries: Number of retries performed
+    :ivar float retry_wait_time: Total seconds spent waiting before retries
+    """
+
+    def __init__(
+        self,
+        max_retries=3,
+        backoff_factor=0.5,
+        max_backoff=30,
+        status_forcelist=(429, 500, 502, 503, 504),
+        allowed_methods=("GET", "HEAD", "OPTIONS"),
+    ):
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.max_backoff = max_backoff
+        self.status_forcelist = frozenset(status_forcelist)
+        self.allowed_methods = frozenset(m.upper() for m in allowed_methods)
+
+        self.retries = 0
+        self.retry_wait_time = 0.0
+
+    def should_retry(self, method, attempt, response=None):
+        """
+        Returns True if the request should be sent again
+
+        Args:
+            method (str): HTTP method
+            attempt (int): Number of retries already made for this request
+            response (optional): Response received (None if the connection failed)
+
+        Returns:
+            bool: True if the request should be retried
+        """
+        if attempt >= self.max_retries or method.upper() not in self.allowed_methods:
+            return False
+        return response is None or response.status_code in self.status_forcelist
+
+    def get_backoff(self, attempt, response=None):
+        """
+        Returns the seconds to wait before the next retry and updates the counters
+
+        The Retry-After header is used when the response has one,
+        otherwise a random delay up to backoff_factor * 2 ** attempt (capped at max_backoff).
+
+        Args:
+            attempt (int): Number of retries already made for this request
+            response (optional): Response received (None if the connection failed)
+
+        Returns:
+            float: Seconds to wait
+        """
+        delay = None
+        if response is not None:
+            delay = self._parse_retry_after(response.headers.get("Retry-After"))
+        if delay is None:
+            delay = random.uniform(
+                0, min(self.max_backoff, self.backoff_factor * 2**attempt)
+            )
+
+        self.retries += 1
+        self.retry_wait_time += delay
+        return delay
+
+    def stats(self):
+        """
+        Returns the retry counters
+
+        Returns:
+            dict: Number of retries and total seconds waited before retries
+        """
+        return {"retries": self.retries, "retry_wait_time": self.retry_wait_time}
+
+    def _parse_retry_after(self, retry_after):
+        if not retry_after:
+            return None
+        retry_after = retry_after.strip()
+        if retry_after.isdigit():
+            return float(retry_after)
+        try:
+            retry_at = parsedate_to_datetime(retry_after)
+        except (TypeError, ValueError):
+            return None
+        if retry_at.tzinfo is None:
+            retry_at = retry_at.replace(tzinfo=timezone.utc)
+        return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+
+rate_limiter = EC3RateLimiter()
+retry_policy = EC3RetryPolicy()
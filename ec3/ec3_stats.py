@@ -0,0 +1,123 @@
+import numpy as np
+import pandas as pd
+
+from .ec3_export import MATERIAL_SCHEMA, to_dataframe
+
+# Declared units are converted to a common unit per dimension before comparing GWP
+# (ex: a material declared per "1 yd3" is compared per m3).
+DECLARED_UNITS = {
+    "m3": ("m3", 1.0),
+    "yd3": ("m3", 0.764554857984),
+    "cy": ("m3", 0.764554857984),
+    "ft3": ("m3", 0.028316846592),
+    "l": ("m3", 0.001),
+    "kg": ("kg", 1.0),
+    "g": ("kg", 0.001),
+    "t": ("kg", 1000.0),
+    "tonne": ("kg", 1000.0),
+    "lb": ("kg", 0.45359237),
+    "m2": ("m2", 1.0),
+    "ft2": ("m2", 0.09290304),
+    "sf": ("m2", 0.09290304),
+    "sqft": ("m2", 0.09290304),
+    "m": ("m", 1.0),
+    "ft": ("m", 0.3048),
+}
+
+GWP_UNITS = {
+    "kgco2e": 1.0,
+    "tco2e": 1000.0,
+    "gco2e": 0.001,
+}
+
+DEFAULT_PERCENTILES = (10, 20, 30, 40, 50, 60, 70, 80, 90)
+
+
+def _to_frame(data, schema):
+    if isinstance(data, pd.DataFrame):
+        return data
+    return to_dataframe(data, schema)
+
+
+def normalize_gwp(data, schema=MATERIAL_SCHEMA):
+    """
+    Adds GWP per normalized declared unit to the flattened records
+
+    The declared unit (ex: "1 yd3") is converted to the common unit of its dimension (ex: m3)
+    and the GWP to kgCO2e, giving a "gwp_per_unit" column that can be compared across records.
+    Records with an unknown GWP unit get NaN. Unknown declared units are kept as they are.
+
+    Args:
+        data (list | pandas.DataFrame): Records (as returned by get_materials or get_epds) or the DataFrame from ec3_export.to_dataframe
+        schema (list, optional): Export schema used when records are passed. Defaults to MATERIAL_SCHEMA.
+
+    Returns:
+        pandas.DataFrame: Flattened records with "normalized_unit" and "gwp_per_unit" columns
+    """
+    df = _to_frame(data, schema).copy()
+
+    units = df["declared_unit_unit"].str.strip().str.lower()
+    unit_map = units.map(DECLARED_UNITS)
+    normalized_unit = unit_map.str[0].fillna(units)
+    unit_factor = unit_map.str[1].astype("float64").fillna(1.0)
+
+    declared_amount = df["declared_unit"].fillna(1.0).replace(0, np.nan)
+    gwp_factor = df["gwp_unit"].str.strip().str.lower().map(GWP_UNITS).astype("float64")
+
+    df["normalized_unit"] = normalized_unit.astype("string")
+    df["gwp_per_unit"] = (
+        df["gwp"] * gwp_factor / (declared_amount * unit_factor)
+    ).astype("float64")
+    return df
+
+
+def gwp_statistics(
+    data,
+    by="category_id",
+    percentiles=DEFAULT_PERCENTILES,
+    conservative_percentile=80,
+    achievable_percentile=20,
+    schema=MATERIAL_SCHEMA,
+):
+    """
+    Computes GWP statistics per group (per category by default) on the normalized GWP
+
+    Groups are also split by normalized declared unit so only comparable values are aggregated.
+    The conservative baseline and achievable target follow the EC3 convention of
+    the 80th and 20th percentiles by default.
+
+    Args:
+        data (list | pandas.DataFrame): Records (as returned by get_materials or get_epds) or the DataFrame from ec3_export.to_dataframe / normalize_gwp
+        by (str | list, optional): Column(s) to group by. Defaults to "category_id".
+        percentiles (tuple, optional): Percentiles (0 to 100) to report. Defaults to 10 through 90.
+        conservative_percentile (float, optional): Percentile used as the conservative baseline. Defaults to 80.
+        achievable_percentile (float, optional): Percentile used as the achievable target. Defaults to 20.
+        schema (list, optional): Export schema used when records are passed. Defaults to MATERIAL_SCHEMA.
+
+    Returns:
+        pandas.DataFrame: One row per group and normalized unit with count, mean, min, max, "pct<N>" and baseline columns (kgCO2e per normalized unit)
+    """
+    df = _to_frame(data, schema)
+    if "gwp_per_unit" not in df.columns:
+        df = normalize_gwp(df)
+
+    keys = ([by] if isinstance(by, str) else list(by)) + ["normalized_unit"]
+    df = df.dropna(subset=["gwp_per_unit"])
+    grouped = df.groupby(keys, dropna=False)["gwp_per_unit"]
+
+    stats = grouped.agg(["count", "mean", "min", "max"])
+
+    quantiles = sorted(
+        set(percentiles) | {conservative_percentile, achievable_percentile}
+    )
+    fractions = [q / 100 for q in quantiles]
+    # Reindexing keeps every percentile column when there are no groups to unstack
+    percentile_table = grouped.quantile(fractions).unstack().reindex(columns=fractions)
+    percentile_table.columns = quantiles
+
+    for q in percentiles:
+        stats["pct{:g}".format(q)] = percentile_table[q]
+    stats["conservative_baseline"] = percentile_table[conservative_percentile]
+    stats["achievable_baseline"] = percentile_table[achievable_percentile]
+
+    return stats.reset_index()
@@ -0,0 +1,362 @@
+import json
+import math
+import sqlite3
+import threading
+import time
+
+from .ec3_models import EC3Model
+from .ec3_utils import distance_to_km, haversine_km
+
+# Indexed columns that can be filtered with the "<column>__<op>" params convention
+_RANGE_COLUMNS = {
+    "date_validity_ends": "date_validity_ends",
+    "epd__date_validity_ends": "date_validity_ends",
+    "gwp": "gwp",
+    "latitude": "latitude",
+    "longitude": "longitude",
+    "updated_on": "updated_on",
+}
+_OPERATORS = {"gt": ">", "gte": ">=", "lt": "<", "lte": "<=", "exact": "="}
+_IGNORED_PARAMS = {"page_size", "page_number", "fields"}
+
+
+class EC3LocalStore:
+    """
+    Local SQLite store of EC3 records keyed by id (or open_xpd_uuid) with incremental sync state
+
+    Records are grouped by kind (ex: "epds" or "materials"). For each kind the store keeps a
+    high-water mark, the newest timestamp seen by the last sync, so the next sync only requests newer records.
+
+    Category id, validity end date, GWP per declared unit and plant latitude/longitude are indexed,
+    so query can filter stored records with the same params conventions as get_epds / get_materials.
+
+    Usage:
+        >>> store = EC3LocalStore("ec3_store.sqlite")
+        >>> ec3_epds.sync_epds(store, params={})
+        >>> store.upsert("materials", ec3_materials.get_materials(return_all=True, params=mat_param_dict))
+        >>> store.query("materials", params={"category": ready_mix_id, "gwp__lt": 300})
+    """
+
+    def __init__(self, path="ec3_store.sqlite"):
+        """
+        Args:
+            path (str, optional): Path to the SQLite file. Defaults to "ec3_store.sqlite".
+        """
+        self.path = path
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS records (
+                kind TEXT,
+                key TEXT,
+                updated_on TEXT,
+                data TEXT,
+                category_id TEXT,
+                date_validity_ends TEXT,
+                gwp REAL,
+                latitude REAL,
+                longitude REAL,
+                PRIMARY KEY (kind, key)
+            );
+            CREATE TABLE IF NOT EXISTS sync_state (
+                kind TEXT PRIMARY KEY,
+                high_water_mark TEXT,
+                synced_at REAL
+            );
+            """)
+
+        # Stores created before the indexed columns existed
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(records)")}
+        for column, column_type in [
+            ("category_id", "TEXT"),
+            ("date_validity_ends", "TEXT"),
+            ("gwp", "REAL"),
+            ("latitude", "REAL"),
+            ("longitude", "REAL"),
+        ]:
+            if column not in columns:
+                self._conn.execute(
+                    "ALTER TABLE records ADD COLUMN {} {}".format(column, column_type)
+                )
+
+        self._conn.executescript("""
+            CREATE INDEX IF NOT EXISTS records_category ON records (kind, category_id);
+            CREATE INDEX IF NOT EXISTS records_validity ON records (kind, date_validity_ends);
+            CREATE INDEX IF NOT EXISTS records_gwp ON records (kind, gwp);
+            CREATE INDEX IF NOT EXISTS records_location ON records (kind, latitude, longitude);
+            """)
+        self._conn.commit()
+
+    def upsert(self, kind, records, timestamp_field="updated_on"):
+        """
+        Inserts records or replaces the stored copy of records with the same key
+
+        Args:
+            kind (str): Kind of record (ex: "epds")
+            records (list): List of record dictionaries (or ec3.ec3_models models)
+            timestamp_field (str, optional): Field holding the last update time. Defaults to "updated_on".
+
+        Returns:
+            int: Number of records written
+        """
+        rows = []
+        for record in records:
+            if isinstance(record, EC3Model):
+                record = record.to_dict()
+            key = record.get("id") or record.get("open_xpd_uuid")
+            if key is None:
+                continue
+            rows.append(
+                (kind, key, record.get(timestamp_field), json.dumps(record))
+                + self._index_values(record)
+            )
+
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO records "
+                "(kind, key, updated_on, data, category_id, date_validity_ends, gwp, latitude, longitude) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+            self._conn.commit()
+        return len(rows)
+
+    def merge(self, kind, pages, timestamp_field="updated_on"):
+        """
+        Upserts each page of records as it arrives, then advances the high-water mark
+        The mark only moves once every page has been merged, so an interrupted sync is simply repeated.
+
+        Args:
+            kind (str): Kind of record (ex: "epds")
+            pages (iterable): Iterable of lists of record dictionaries
+            timestamp_field (str, optional): Field holding the last update time. Defaults to "updated_on".
+
+        Returns:
+            int: Number of records merged
+        """
+        merged = 0
+        newest = self.get_high_water_mark(kind)
+
+        for page in pages:
+            count, newest = self._merge_page(kind, page, newest, timestamp_field)
+            merged += count
+
+        self.set_high_water_mark(kind, newest)
+        return merged
+
+    async def amerge(self, kind, pages, timestamp_field="updated_on"):
+        """
+        Asyncio counterpart of merge for pages from an async iterable (ex: iter_epds of AsyncEC3epds)
+
+        Args:
+            kind (str): Kind of record (ex: "epds")
+            pages (async iterable): Async iterable of lists of record dictionaries
+            timestamp_field (str, optional): Field holding the last update time. Defaults to "updated_on".
+
+        Returns:
+            int: Number of records merged
+        """
+        merged = 0
+        newest = self.get_high_water_mark(kind)
+
+        async for page in pages:
+            count, newest = self._merge_page(kind, page, newest, timestamp_field)
+            merged += count
+
+        self.set_high_water_mark(kind, newest)
+        return merged
+
+    def _merge_page(self, kind, page, newest, timestamp_field):
+        """
+        Upserts a page and returns the number of records written and the newest timestamp seen so far
+        """
+        count = self.upsert(kind, page, timestamp_field=timestamp_field)
+        timestamps = [r[timestamp_field] for r in page if r.get(timestamp_field)]
+        if timestamps and (newest is None or max(timestamps) > newest):
+            newest = max(timestamps)
+        return count, newest
+
+    def query(self, kind, params=None, limit=None):
+        """
+        Returns stored records matching the params, using the same conventions as get_epds / get_materials
+
+        Supported params:
+            - "category": category id or list of category ids
+            - "id" / "open_xpd_uuid": exact match
+            - "<field>__gt", "__gte", "__lt", "__lte", "__exact" for date_validity_ends
+              (or epd__date_validity_ends), gwp, latitude, longitude and updated_on
+            - "latitude", "longitude" and "plant__distance__lt" (ex: "100 mi") for plants within a distance
+            - "sort_by": one of the indexed fields, prefixed with "-" for descending order
+
+        Args:
+            kind (str): Kind of record (ex: "epds")
+            params (dict, optional): Dictionary of filters. Defaults to None.
+            limit (int, optional): Maximum number of records to return. Defaults to None.
+
+        Returns:
+            list: List of dictionaries of matching records
+        """
+        params = dict(params or {})
+        clauses = ["kind = ?"]
+        values = [kind]
+        order_by = "key"
+
+        center = None
+        if "plant__distance__lt" in params:
+            center = (
+                float(params.pop("latitude")),
+                float(params.pop("longitude")),
+                distance_to_km(params.pop("plant__distance__lt")),
+            )
+            # Bounding box on the location index, refined with the exact distance below
+            lat, long, max_km = center
+            lat_delta = max_km / 111.0
+            long_delta = max_km / (111.0 * max(math.cos(math.radians(lat)), 0.01))
+            clauses.append("latitude BETWEEN ? AND ? AND longitude BETWEEN ? AND ?")
+            values.extend(
+                [lat - lat_delta, lat + lat_delta, long - long_delta, long + long_delta]
+            )
+
+        for name, value in params.items():
+            field, _, op = name.rpartition("__")
+            if not field or op not in _OPERATORS:
+                field, op = name, "exact"
+
+            if name in _IGNORED_PARAMS:
+                continue
+            elif name == "sort_by":
+                column = _RANGE_COLUMNS.get(value.lstrip("-"))
+                if column is None:
+                    raise ValueError("Cannot sort stored records by: {}".format(value))
+                order_by = column + (" DESC" if value.startswith("-") else "")
+            elif name == "category":
+                category_ids = value if isinstance(value, (list, tuple)) else [value]
+                clauses.append(
+                    "category_id IN ({})".format(",".join("?" * len(category_ids)))
+                )
+                values.extend(category_ids)
+            elif name in ("id", "open_xpd_uuid"):
+                clauses.append("key = ?")
+                values.append(value)
+            elif field in _RANGE_COLUMNS:
+                clauses.append("{} {} ?".format(_RANGE_COLUMNS[field], _OPERATORS[op]))
+                values.append(value)
+            else:
+                raise ValueError("Cannot filter stored records by: {}".format(name))
+
+        sql = (
+            "SELECT data, latitude, longitude FROM records WHERE {} ORDER BY {}".format(
+                " AND ".join(clauses), order_by
+            )
+        )
+        if limit is not None and center is None:
+            sql += " LIMIT {:d}".format(limit)
+
+        with self._lock:
+            rows = self._conn.execute(sql, values).fetchall()
+
+        if center is not None and rows:
+            lat, long, max_km = center
+            distances = haversine_km(
+                [r[1] for r in rows], [r[2] for r in rows], lat, long
+            )
+            rows = [row for row, distance in zip(rows, distances) if distance < max_km]
+            if limit is not None:
+                rows = rows[:limit]
+
+        return [json.loads(row[0]) for row in rows]
+
+    def get_high_water_mark(self, kind):
+        """
+        Returns the newest timestamp recorded by the last sync of this kind (None if never synced)
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT high_water_mark FROM sync_state WHERE kind = ?", (kind,)
+            ).fetchone()
+        return row[0] if row else None
+
+    def set_high_water_mark(self, kind, high_water_mark):
+        """
+        Records the newest timestamp synced for this kind
+        """
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO sync_state VALUES (?, ?, ?)",
+                (kind, high_water_mark, time.time()),
+            )
+            self._conn.commit()
+
+    def get(self, kind, key):
+        """
+        Returns a stored record by id or open_xpd_uuid (None if not stored)
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT data FROM records WHERE kind = ? AND key = ?", (kind, key)
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def iter_records(self, kind, batch_size=1000):
+        """
+        Yields every stored record of this kind, reading batch_size rows at a time
+        """
+        last_key = ""
+        while True:
+            with self._lock:
+                rows = self._conn.execute(
+                    "SELECT key, data FROM records WHERE kind = ? AND key > ? "
+                    "ORDER BY key LIMIT ?",
+                    (kind, last_key, batch_size),
+                ).fetchall()
+            if not rows:
+                return
+            for last_key, data in rows:
+                yield json.loads(data)
+
+    def count(self, kind):
+        """
+        Returns the number of stored records of this kind
+        """
+        with self._lock:
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM records WHERE kind = ?", (kind,)
+            ).fetchone()[0]
+
+    def _index_values(self, record):
+        category = record.get("category")
+        if isinstance(category, dict):
+            category = category.get("id")
+
+        date_validity_ends = record.get("date_validity_ends")
+        if date_validity_ends is None and isinstance(record.get("epd"), dict):
+            date_validity_ends = record["epd"].get("date_validity_ends")
+
+        gwp = record.get("gwp")
+        if isinstance(gwp, str):
+            try:
+                gwp = float(gwp.split()[0])
+            except (IndexError, ValueError):
+                gwp = None
+        elif not isinstance(gwp, (int, float)):
+            gwp = None
+
+        plant = record.get("plant_or_group")
+        if not isinstance(plant, dict):
+            plant = {}
+
+        return (
+            category,
+            date_validity_ends,
+            gwp,
+            plant.get("latitude"),
+            plant.get("longitude"),
+        )
+
+    def close(self):
+        """
+        Closes the SQLite connection
+        """
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,372 @@
+import base64
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+
+import requests
+
+from .ec3_utils import normalize_params
+
+
+def make_fixture_key(method, url, params=None, data=None):
+    """
+    Returns the fixture key for a request
+
+    Params are normalized with ec3_utils.normalize_params, like the response cache keys, so the order of params does not change the key.
+    The Authorization header is never part of the key, so fixtures recorded with one token replay with any other.
+
+    Args:
+        method (str): HTTP method
+        url (str): Request url
+        params (dict, optional): Query params. Defaults to None.
+        data (str | bytes, optional): Request body. Defaults to None.
+
+    Returns:
+        str: Hex digest identifying the request
+    """
+    if isinstance(data, bytes):
+        data = data.decode("utf-8")
+
+    key_material = json.dumps([method.upper(), url, normalize_params(params), data])
+    return hashlib.sha256(key_material.encode("utf-8")).hexdigest()
+
+
+def _build_response(url, status_code, headers, body):
+    response = requests.models.Response()
+    response.status_code = status_code
+    response.url = url
+    response.headers = requests.structures.CaseInsensitiveDict(headers)
+    response._content = body
+    return response
+
+
+class EC3RecordingTransport:
+    """
+    Transport sending requests over the client's session and recording every response to disk
+
+    Each response is written to directory as a json fixture named by make_fixture_key,
+    which EC3ReplayTransport can serve back without a network connection.
+    Request headers (including the bearer token) are not recorded.
+
+    :ivar str directory: Directory where fixtures are written
+    :ivar int recorded: Number of responses recorded
+
+    Usage:
+        >>> ec3_materials.transport = EC3RecordingTransport("fixtures/materials")
+        >>> ec3_materials.get_materials(return_all=True, params=mat_param_dict)
+    """
+
+    def __init__(self, directory):
+        """
+        Args:
+            directory (str): Directory where fixtures are written (created if missing)
+        """
+        self.directory = directory
+        self.recorded = 0
+
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+
+    def request(self, session, method, url, params=None, data=None, **kwargs):
+        """
+        Sends the request over the session and records the response
+
+        Args:
+            session (requests.Session): Session of the calling client
+            method (str): HTTP method
+            url (str): Request url
+            params (dict, optional): Query params. Defaults to None.
+            data (str | bytes, optional): Request body. Defaults to None.
+
+        Returns:
+            requests.models.Response: Response received
+        """
+        response = session.request(method, url, params=params, data=data, **kwargs)
+
+        fixture = {
+            "method": method.upper(),
+            "url": url,
+            "params": params,
+            "status_code": response.status_code,
+            "headers": dict(response.headers),
+            "body": base64.b64encode(response.content).decode("ascii"),
+        }
+        key = make_fixture_key(method, url, params=params, data=data)
+        path = os.path.join(self.directory, key + ".json")
+        tmp_path = "{}.{}.tmp".format(path, threading.get_ident())
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(fixture, f, default=str)
+        os.replace(tmp_path, path)
+
+        with self._lock:
+            self.recorded += 1
+        return response
+
+
+class EC3ReplayTransport:
+    """
+    Transport serving recorded fixtures instead of sending requests
+
+    Replays are deterministic: the same request always gets the same recorded response.
+    Latency and errors can be injected to benchmark pagination, retries and parsing offline.
+    Whether a request gets an injected error only depends on the seed, the request and how many
+    times it was sent before, so runs are repeatable even with concurrent pagination.
+
+    :ivar str directory: Directory holding the recorded fixtures
+    :ivar float latency: Seconds added before each response, defaults to 0
+    :ivar float jitter: Maximum random seconds added on top of latency, defaults to 0
+    :ivar float error_rate: Fraction of requests answered with error_status instead of the fixture, defaults to 0
+    :ivar int error_status: Status code of injected errors, defaults to 503
+    :ivar int seed: Seed of the latency jitter and error injection, defaults to 0
+    :ivar int replayed: Number of requests served
+
+    Usage:
+        >>> ec3_materials.transport = EC3ReplayTransport("fixtures/materials", latency=0.2, error_rate=0.05)
+        >>> ec3_materials.get_materials(return_all=True, params=mat_param_dict)
+    """
+
+    def __init__(
+        self,
+        directory,
+        latency=0.0,
+        jitter=0.0,
+        error_rate=0.0,
+        error_status=503,
+        seed=0,
+    ):
+        """
+        Args:
+            directory (str): Directory holding the recorded fixtures
+            latency (float, optional): Seconds added before each response. Defaults to 0.
+            jitter (float, optional): Maximum random seconds added on top of latency. Defaults to 0.
+            error_rate (float, optional): Fraction of requests answered with error_status. Defaults to 0.
+            error_status (int, optional): Status code of injected errors. Defaults to 503.
+            seed (int, optional): Seed of the latency jitter and error injection. Defaults to 0.
+        """
+        self.directory = directory
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.seed = seed
+        self.replayed = 0
+
+        self._fixtures = {}
+        self._sent = {}
+        self._lock = threading.Lock()
+
+    def request(self, session, method, url, params=None, data=None, **kwargs):
+        """
+        Returns the recorded response for the request
+
+        Args:
+            session (requests.Session): Session of the calling client (unused)
+            method (str): HTTP method
+            url (str): Request url
+            params (dict, optional): Query params. Defaults to None.
+            data (str | bytes, optional): Request body. Defaults to None.
+
+        Returns:
+            requests.models.Response: Recorded (or injected error) response
+
+        Raises:
+            LookupError: No fixture was recorded for the request
+        """
+        key = make_fixture_key(method, url, params=params, data=data)
+        fixture = self._load(key, method, url)
+
+        with self._lock:
+            attempt = self._sent.get(key, 0)
+            self._sent[key] = attempt + 1
+            self.replayed += 1
+
+        rng = random.Random("{}:{}:{}".format(self.seed, key, attempt))
+        delay = self.latency + (rng.uniform(0, self.jitter) if self.jitter else 0.0)
+        if delay > 0:
+            time.sleep(delay)
+
+        if self.error_rate and rng.random() < self.error_rate:
+            return _build_response(
+                url, self.error_status, {"Retry-After": "0"}, b'{"error": "injected"}'
+            )
+
+        return _build_response(
+            url, fixture["status_code"], fixture["headers"], fixture["body"]
+        )
+
+    def reset(self):
+        """
+        Resets the per-request counters so the next run injects the same errors again
+        """
+        with self._lock:
+            self._sent.clear()
+            self.replayed = 0
+
+    def _load(self, key, method, url):
+        fixture = self._fixtures.get(key)
+        if fixture is None:
+            path = os.path.join(self.directory, key + ".json")
+            try:
+                with open(path, encoding="utf-8") as f:
+                    fixture = json.load(f)
+            except FileNotFoundError:
+                raise LookupError(
+                    "No fixture recorded for {} {} in {}".format(
+                        method.upper(), url, self.directory
+                    )
+                )
+            fixture["body"] = base64.b64decode(fixture["body"])
+            self._fixtures[key] = fixture
+        return fixture
+
+
+def synthetic_records(count, seed=0, null_fraction=0.2):
+    """
+    Returns generated material-like records for benchmarking
+
+    Records have the same shape as EC3 material records (nested category, plant and manufacturer,
+    declared unit and GWP strings) and a share of null values, so null removal and projections
+    do representative work. The same count and seed always give the same records.
+
+    Args:
+        count (int): Number of records
+        seed (int, optional): Seed of the generated values. Defaults to 0.
+        null_fraction (float, optional): Fraction of optional fields set to None. Defaults to 0.2.
+
+    Returns:
+        list: List of record dictionaries
+    """
+    rng = random.Random(seed)
+    units = ("1 m3", "1 yd3", "1 kg", "1 t", "1 m2")
+
+    def maybe(value):
+        return None if rng.random() < null_fraction else value
+
+    records = []
+    for i in range(count):
+        category_id = "{:032x}".format(rng.randrange(40))
+        records.append(
+            {
+                "id": "{:032x}".format(i),
+                "open_xpd_uuid": "EC3{:07d}".format(i),
+                "name": "Material {}".format(i),
+                "gwp": "{:.2f} kgCO2e".format(rng.uniform(50, 600)),
+                "gwp_per_kg": maybe("{:.4f} kgCO2e".format(rng.uniform(0.05, 2))),
+                "declared_unit": rng.choice(units),
+                "date_validity_ends": maybe(
+                    "20{:02d}-{:02d}-01".format(
+                        rng.randrange(20, 30), rng.randint(1, 12)
+                    )
+                ),
+                "category": {
+                    "id": category_id,
+                    "name": "Category {}".format(category_id[-2:]),
+                    "display_name": maybe("Display {}".format(category_id[-2:])),
+                    "masterformat": maybe("03 30 00 Cast-in-Place Concrete"),
+                },
+                "plant_or_group": {
+                    "id": "{:032x}".format(rng.randrange(1000)),
+                    "name": maybe("Plant {}".format(i % 1000)),
+                    "latitude": rng.uniform(25, 49),
+                    "longitude": rng.uniform(-124, -67),
+                    "owned_by": {
+                        "name": "Manufacturer {}".format(i % 97),
+                        "website": maybe("https://example.com"),
+                    },
+                },
+                "concrete_compressive_strength_at_28d": maybe(
+                    "{} psi".format(rng.choice((3000, 4000, 5000, 6000)))
+                ),
+                "warnings": [maybe("warning") for _ in range(rng.randrange(3))],
+            }
+        )
+    return records
+
+
+class EC3SyntheticTransport:
+    """
+    Transport paging through records held in memory instead of sending requests
+
+    Pages are served the way the EC3 Api serves them: page_number and page_size params select the page,
+    the X-Total-Count header reports the number of matches and a page number past the last page gets HTTP 404.
+    Together with synthetic_records it lets pagination, decoding and projections be benchmarked at any
+    scale (ex: 1M records) without recording fixtures first. Every request gets the same records,
+    whatever url and filters were sent.
+
+    :ivar list records: Records served
+    :ivar float latency: Seconds added before each response, defaults to 0
+    :ivar int requests: Number of requests served
+    :ivar int bytes: Number of body bytes served
+
+    Usage:
+        >>> ec3_materials.transport = EC3SyntheticTransport(synthetic_records(100000), latency=0.1)
+        >>> ec3_materials.get_materials(return_all=True, params=mat_param_dict)
+    """
+
+    def __init__(self, records, latency=0.0):
+        """
+        Args:
+            records (list): Records served
+            latency (float, optional): Seconds added before each response. Defaults to 0.
+        """
+        self.records = records
+        self.latency = latency
+        self.requests = 0
+        self.bytes = 0
+
+        self._lock = threading.Lock()
+
+    def request(self, session, method, url, params=None, data=None, **kwargs):
+        """
+        Returns the requested page of records
+
+        Args:
+            session (requests.Session): Session of the calling client (unused)
+            method (str): HTTP method
+            url (str): Request url
+            params (dict, optional): Query params. Defaults to None.
+            data (str | bytes, optional): Request body (unused). Defaults to None.
+
+        Returns:
+            requests.models.Response: Page of records
+        """
+        params = params or {}
+        page_number = int(params.get("page_number", 1))
+        page_size = int(params.get("page_size", 100))
+        total_count = len(self.records)
+        start = (page_number - 1) * page_size
+
+        if self.latency > 0:
+            time.sleep(self.latency)
+
+        if page_number < 1 or (start >= total_count and page_number > 1):
+            response = _build_response(
+                url,
+                404,
+                {"X-Total-Count": str(total_count)},
+                b'{"error": "Invalid page."}',
+            )
+        else:
+            body = json.dumps(self.records[start : start + page_size]).encode("utf-8")
+            response = _build_response(
+                url,
+                200,
+                {"Content-Type": "application/json", "X-Total-Count": str(total_count)},
+                body,
+            )
+
+        with self._lock:
+            self.requests += 1
+            self.bytes += len(response.content)
+        return response
+
+    def reset(self):
+        """
+        Resets the request and byte counters
+        """
+        with self._lock:
+            self.requests = 0
+            self.bytes = 0
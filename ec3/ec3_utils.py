@@ -1,32 +1,184 @@
-import pgeocode
+import functools
+import re
+import threading
 
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_UNIT = {"km": 1.0, "mi": 1.609344, "m": 0.001, "ft": 0.0003048}
 
-def postal_to_latlong(postal_code, country_code="US"):
+_nominatim_cache = {}
+_nominatim_lock = threading.Lock()
+
+
+def get_nominatim(country_code="US"):
     """
-    Converts postal code to latitude and longitude returned as array.
-    Refer to pgeocode documentation for supported country codes.
-    If not found, then coordinates for Null Island are returned (0,0).
+    Returns a pgeocode.Nominatim for the country, loading its postal dataset only once per process.
+    pgeocode (and pandas with it) is imported on first use, so importing ec3 stays fast.
 
     Args:
-        postal_code (int): postal code
         country_code (str, optional): Two letter country code. Defaults to 'US'.
 
     Returns:
-        A tuple containing a float (latitude) and a float (longitude)
+        pgeocode.Nominatim: Shared Nominatim instance for the country
     """
+    import pgeocode
+
+    country_code = country_code.upper()
+    with _nominatim_lock:
+        nomi = _nominatim_cache.get(country_code)
+        if nomi is None:
+            nomi = pgeocode.Nominatim(country_code)
+            _nominatim_cache[country_code] = nomi
+    return nomi
+
+
+@functools.lru_cache(maxsize=4096)
+def _cached_postal_to_latlong(postal_code, country_code):
     lat = 0
     long = 0
-    nomi = pgeocode.Nominatim(country_code)
+    nomi = get_nominatim(country_code)
     if nomi:
-        df = nomi.query_postal_code(str(postal_code))
+        df = nomi.query_postal_code(postal_code)
         lat = df["latitude"].item()
         long = df["longitude"].item()
     return (lat, long)
 
 
-def recursive_dict_list_return(dict_item, key_name, out_keys, outlist=[]):
+def postal_to_latlong(postal_code, country_code="US"):
     """
-    Recursively loops through a nested json/dictionary based on the key name
+    Converts postal code to latitude and longitude returned as array.
+    Refer to pgeocode documentation for supported country codes.
+    If not found, then coordinates for Null Island are returned (0,0).
+    Results are memoized per postal code and country.
+
+    Args:
+        postal_code (int): postal code
+        country_code (str, optional): Two letter country code. Defaults to 'US'.
+
+    Returns:
+        A tuple containing a float (latitude) and a float (longitude)
+    """
+    return _cached_postal_to_latlong(str(postal_code), country_code.upper())
+
+
+def postal_to_latlong_batch(postal_codes, country_code="US"):
+    """
+    Converts many postal codes to latitudes and longitudes with a single dataset query.
+    Refer to pgeocode documentation for supported country codes.
+
+    Args:
+        postal_codes (list): List of postal codes
+        country_code (str, optional): Two letter country code. Defaults to 'US'.
+
+    Returns:
+        list: List of (latitude, longitude) tuples in the same order as postal_codes
+    """
+    codes = [str(postal_code) for postal_code in postal_codes]
+    if not codes:
+        return []
+
+    df = get_nominatim(country_code).query_postal_code(codes)
+    return list(zip(df["latitude"].tolist(), df["longitude"].tolist()))
+
+
+def distance_to_km(distance):
+    """
+    Converts a distance string with units, as used by the EC3 API, to kilometers
+
+    Args:
+        distance (str): Distance with units (ex: "100 mi" or "50 km")
+
+    Returns:
+        float: Distance in kilometers
+    """
+    match = re.fullmatch(r"\s*([0-9.]+)\s*([a-zA-Z]+)\s*", str(distance))
+    if not match or match.group(2).lower() not in KM_PER_UNIT:
+        raise ValueError("Unsupported distance: {}".format(distance))
+    return float(match.group(1)) * KM_PER_UNIT[match.group(2).lower()]
+
+
+def haversine_km(lats1, longs1, lats2, longs2):
+    """
+    Great-circle distances in kilometers computed with numpy broadcasting
+
+    Passing column vectors for the first point and row vectors for the second
+    returns the full matrix of distances between every pair.
+
+    Args:
+        lats1 (array-like): Latitudes of the first points
+        longs1 (array-like): Longitudes of the first points
+        lats2 (array-like): Latitudes of the second points
+        longs2 (array-like): Longitudes of the second points
+
+    Returns:
+        numpy.ndarray: Distances in kilometers
+    """
+    import numpy as np
+
+    lats1, longs1, lats2, longs2 = (
+        np.radians(np.asarray(v, dtype=float)) for v in (lats1, longs1, lats2, longs2)
+    )
+    a = (
+        np.sin((lats2 - lats1) / 2.0) ** 2
+        + np.cos(lats1) * np.cos(lats2) * np.sin((longs2 - longs1) / 2.0) ** 2
+    )
+    return 2.0 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def normalize_params(params):
+    """
+    Returns query params in a canonical form for building request keys
+
+    Params are sorted by name, None values are dropped and values are converted to strings,
+    so the order of params and of int/str spellings does not change a key.
+    Used by both the response cache and the transport fixtures so their keys cannot drift apart.
+
+    Args:
+        params (dict): Query params (None is treated as no params)
+
+    Returns:
+        list: List of [name, value] pairs, where value is a string or list of strings
+    """
+    normalized = []
+    for name, value in sorted((params or {}).items()):
+        if value is None:
+            continue
+        if isinstance(value, (list, tuple)):
+            value = [str(v) for v in value]
+        else:
+            value = str(value)
+        normalized.append([name, value])
+    return normalized
+
+
+def iter_category_tree(category_tree, key_name="subcategories"):
+    """
+    Lazily walks a nested json/dictionary depth first without recursion
+
+    Nodes are yielded in the same order as a recursive pre-order walk.
+    Nothing is copied, so each yielded node is the dictionary from the original tree.
+
+    Args:
+        category_tree (dict): Dictionary with nested data to crawl through
+        key_name (str, optional): Name of key holding the child nodes. Defaults to "subcategories".
+
+    Yields:
+        tuple: (node, depth, path) where path is a tuple of the ids of the node's ancestors
+    """
+    stack = [(category_tree, 0, ())]
+
+    while stack:
+        node, depth, path = stack.pop()
+        yield node, depth, path
+
+        children = node.get(key_name)
+        if children:
+            child_path = path + (node.get("id"),)
+            stack.extend((child, depth + 1, child_path) for child in reversed(children))
+
+
+def recursive_dict_list_return(dict_item, key_name, out_keys, outlist=None):
+    """
+    Loops through a nested json/dictionary based on the key name
 
     This is intended for where the key_name may occur at multiple levels of nesting.
     For example, the "subcategories" key occurs at multiple levels of the EC3 categories tree.
@@ -37,22 +189,19 @@ def recursive_dict_list_return(dict_item, key_name, out_keys, outlist=[]):
         dict_item (dict): Dictionary with nested data to crawl through
         key_name (str): Name of key to crawl through nested dictionary
         out_keys (list[str]): List of key names to return
-        outlist (list, optional): List to return (can be left empty if starting a new list)
+        outlist (list, optional): List to append to. Defaults to a new list.
 
     Returns:
         list: List of dictionaries with keys provided in out_keys
     """
-    if (key_name in dict_item.keys()) and dict_item[key_name]:
-        new_dict = {k: dict_item[k] for k in out_keys}
-        outlist.append(new_dict)
-
-        for d in dict_item[key_name]:
-            recursive_dict_list_return(d, key_name, out_keys, outlist=outlist)
-
-    elif key_name in dict_item:
-        new_dict = {k: dict_item[k] for k in out_keys}
-        outlist.append(new_dict)
+    if outlist is None:
+        outlist = []
 
+    outlist.extend(
+        {k: node.get(k) for k in out_keys}
+        for node, _, _ in iter_category_tree(dict_item, key_name)
+        if key_name in node
+    )
     return outlist
 
 
@@ -66,16 +215,11 @@ def get_masterformat_category_dict(category_tree):
     Returns:
         dict: Dictionary with masterformat codes as keys (ex: {'03 00 00 Concrete': '484df282d43f4b0e855fad6b351ce006'})
     """
-    category_dict_list = recursive_dict_list_return(
-        category_tree, "subcategories", ["masterformat", "id"]
-    )
-
-    masterformat_dict = {
-        i.get("masterformat"): i.get("id")
-        for i in category_dict_list
-        if i.get("masterformat") and i.get("id")
+    return {
+        node["masterformat"]: node["id"]
+        for node, _, _ in iter_category_tree(category_tree)
+        if "subcategories" in node and node.get("masterformat") and node.get("id")
     }
-    return masterformat_dict
 
 
 def get_displayname_category_dict(category_tree):
@@ -88,12 +232,126 @@ def get_displayname_category_dict(category_tree):
     Returns:
         dict: Dictionary with display names as keys (ex: {'Ready Mix': '6991a61b52b24e59b1244fe9dee59e9b'})
     """
-    category_dict_list = recursive_dict_list_return(
-        category_tree, "subcategories", ["display_name", "id"]
-    )
-    display_name_dict = {
-        i.get("display_name"): i.get("id")
-        for i in category_dict_list
-        if i.get("display_name") and i.get("id")
+    return {
+        node["display_name"]: node["id"]
+        for node, _, _ in iter_category_tree(category_tree)
+        if "subcategories" in node and node.get("display_name") and node.get("id")
+    }
+
+
+def build_category_indexes(category_tree):
+    """
+    Builds every category lookup index in a single walk of the tree
+
+    Args:
+        category_tree (dict): This should be a nested dictionary of all or part of the category tree
+
+    Returns:
+        dict: Dictionary with the following indexes
+            - "masterformat_ids": masterformat codes as keys and ids as values
+            - "display_name_ids": display names as keys and ids as values
+            - "nodes": ids as keys and category nodes as values
+            - "ancestors": ids as keys and tuples of ancestor ids (root first) as values
+            - "descendants": ids as keys and lists of all descendant ids as values
+    """
+    masterformat_ids = {}
+    display_name_ids = {}
+    nodes = {}
+    ancestors = {}
+    descendants = {}
+
+    for node, _, path in iter_category_tree(category_tree):
+        category_id = node.get("id")
+        if not category_id:
+            continue
+
+        if "subcategories" in node:
+            if node.get("masterformat"):
+                masterformat_ids[node["masterformat"]] = category_id
+            if node.get("display_name"):
+                display_name_ids[node["display_name"]] = category_id
+
+        nodes[category_id] = node
+        ancestors[category_id] = path
+        descendants[category_id] = []
+        for ancestor_id in path:
+            if ancestor_id in descendants:
+                descendants[ancestor_id].append(category_id)
+
+    return {
+        "masterformat_ids": masterformat_ids,
+        "display_name_ids": display_name_ids,
+        "nodes": nodes,
+        "ancestors": ancestors,
+        "descendants": descendants,
     }
-    return display_name_dict
+
+
+@functools.lru_cache(maxsize=64)
+def build_projection(fields):
+    """
+    Builds a nested projection from dotted field paths
+
+    A path keeps the whole value at its end, so ("plant_or_group", "plant_or_group.latitude")
+    keeps the whole plant_or_group dictionary.
+
+    Args:
+        fields (tuple[str]): Dotted field paths (ex: ("gwp", "plant_or_group.latitude"))
+
+    Returns:
+        dict: Nested dictionary of the keys to keep (None keeps the whole value)
+    """
+    projection = {}
+    for field in fields:
+        node = projection
+        *parents, last = field.split(".")
+        for part in parents:
+            if part in node and node[part] is None:
+                break
+            node = node.setdefault(part, {})
+        else:
+            node[last] = None
+    return projection
+
+
+def projection_roots(fields):
+    """
+    Returns the top level fields of dotted field paths, in order and without duplicates
+    These are the only fields the Api can select server side.
+
+    Args:
+        fields (list[str]): Dotted field paths (ex: ["gwp", "plant_or_group.latitude"])
+
+    Returns:
+        list: Top level field names (ex: ["gwp", "plant_or_group"])
+    """
+    return list(dict.fromkeys(field.split(".", 1)[0] for field in fields))
+
+
+def project_record(record, projection):
+    """
+    Returns a copy of the record holding only the projected fields
+    Lists of dictionaries are projected item by item.
+
+    Args:
+        record (dict): Record dictionary
+        projection (dict): Nested projection from build_projection
+
+    Returns:
+        dict: Pruned record
+    """
+    pruned = {}
+    for key, sub_projection in projection.items():
+        if key not in record:
+            continue
+        value = record[key]
+        if sub_projection is not None:
+            if isinstance(value, dict):
+                value = project_record(value, sub_projection)
+            elif isinstance(value, list):
+                value = [
+                    project_record(v, sub_projection) if isinstance(v, dict) else v
+                    for v in value
+                ]
+        pruned[key] = value
+    return pruned
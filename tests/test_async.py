@@ -0,0 +1,180 @@
+import asyncio
+import json
+import threading
+import time
+
+import pytest
+
+from ec3.ec3_transport import (
+    EC3SyntheticTransport,
+    _build_response,
+    synthetic_records,
+)
+
+pytest.importorskip("httpx")
+
+from ec3 import (  # noqa: E402
+    AsyncEC3Categories,
+    AsyncEC3epds,
+    AsyncEC3Materials,
+    AsyncEC3Projects,
+)
+
+RECORD_COUNT = 600
+
+
+def run_with(client_class, transport, coroutine_function):
+    async def run():
+        client = client_class(bearer_token="unused")
+        client.transport = transport
+        if hasattr(client, "only_valid"):
+            client.only_valid = False
+        try:
+            return await coroutine_function(client)
+        finally:
+            await client.aclose()
+
+    return asyncio.run(run())
+
+
+def test_iter_materials_yields_every_record():
+    records = synthetic_records(RECORD_COUNT)
+    transport = EC3SyntheticTransport(records)
+
+    async def collect(ec3_materials):
+        return [r async for r in ec3_materials.iter_materials(params={})]
+
+    result = run_with(AsyncEC3Materials, transport, collect)
+
+    assert [r["id"] for r in result] == [r["id"] for r in records]
+    assert transport.requests == 3
+
+
+def test_iter_projects_stops_requesting_when_loop_breaks():
+    transport = EC3SyntheticTransport(synthetic_records(RECORD_COUNT))
+
+    async def first_page(ec3_projects):
+        ec3_projects.prefetch = False
+        async for page in ec3_projects.iter_projects(by_page=True, params={}):
+            return page
+
+    page = run_with(AsyncEC3Projects, transport, first_page)
+
+    assert len(page) == 250
+    assert transport.requests == 1
+
+
+CATEGORY_TREE = {
+    "id": "root",
+    "name": "Root",
+    "display_name": "Root",
+    "masterformat": "00 00 00 Root",
+    "subcategories": [
+        {
+            "id": "child",
+            "name": "Child",
+            "display_name": "Child",
+            "masterformat": "03 00 00 Child",
+            "subcategories": [],
+        }
+    ],
+}
+
+
+class CategoryTransport(EC3SyntheticTransport):
+    """
+    Synthetic transport serving CATEGORY_TREE for category requests and records otherwise
+    """
+
+    def __init__(self, records=()):
+        super().__init__(list(records))
+        self.tree_requests = 0
+        self.sent_params = []
+
+    def request(self, session, method, url, params=None, data=None, **kwargs):
+        if "/categories" in url:
+            self.tree_requests += 1
+            return _build_response(
+                url,
+                200,
+                {"Content-Type": "application/json"},
+                json.dumps(CATEGORY_TREE).encode(),
+            )
+        self.sent_params.append(dict(params or {}))
+        return super().request(session, method, url, params=params, **kwargs)
+
+
+@pytest.fixture
+def registry():
+    from ec3.ec3_categories import category_registry
+
+    category_registry.clear()
+    yield category_registry
+    category_registry.clear()
+    category_registry.ttl = 86400
+
+
+def test_category_registry_is_loaded_through_the_client(registry):
+    transport = CategoryTransport()
+
+    async def load_twice(ec3_categories):
+        await ec3_categories.get_category_registry(force=True)
+        return await ec3_categories.get_category_registry()
+
+    assert run_with(AsyncEC3Categories, transport, load_twice) is registry
+    assert registry.display_name_ids["Child"] == "child"
+    assert transport.tree_requests == 1
+
+
+def test_category_filter_awaits_a_stale_registry(registry):
+    # Every lookup finds the registry stale, so only the awaited download may load it
+    registry.ttl = 0
+    transport = CategoryTransport(synthetic_records(10))
+
+    async def filtered(ec3_epds):
+        ec3_epds.display_name_filter = ["Child"]
+        return await ec3_epds.get_epds(params={})
+
+    assert len(run_with(AsyncEC3epds, transport, filtered)) == 10
+    assert transport.tree_requests == 1
+    assert transport.sent_params[0]["category"] == ["child"]
+
+
+def test_postal_code_lookups_do_not_block_the_event_loop(monkeypatch):
+    import ec3.ec3_async
+    import ec3.ec3_materials
+
+    lookup_threads = []
+
+    def slow_lookup(postal_code, country_code="US"):
+        lookup_threads.append(threading.get_ident())
+        time.sleep(0.1)
+        return 40.0, -75.0
+
+    def slow_batch_lookup(postal_codes, country_code="US"):
+        return [slow_lookup(postal_code) for postal_code in postal_codes]
+
+    monkeypatch.setattr(ec3.ec3_async, "postal_to_latlong", slow_lookup)
+    monkeypatch.setattr(ec3.ec3_materials, "postal_to_latlong_batch", slow_batch_lookup)
+    transport = EC3SyntheticTransport(synthetic_records(10))
+
+    async def query_with_ticker(ec3_materials):
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                ticks += 1
+                await asyncio.sleep(0.01)
+
+        ticking = asyncio.ensure_future(ticker())
+        try:
+            await ec3_materials.get_materials_within_region("19103", params={})
+            await ec3_materials.get_materials_within_regions(["19103"], params={})
+        finally:
+            ticking.cancel()
+        return ticks
+
+    assert run_with(AsyncEC3Materials, transport, query_with_ticker) > 10
+    assert len(lookup_threads) == 2
+    assert threading.get_ident() not in lookup_threads
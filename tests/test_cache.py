@@ -0,0 +1,164 @@
+import asyncio
+import time
+
+from ec3 import EC3Materials
+from ec3.ec3_async import AsyncEC3Materials
+from ec3.ec3_cache import EC3ResponseCache
+from ec3.ec3_transport import EC3SyntheticTransport, _build_response, synthetic_records
+
+ETAG = '"v1"'
+
+
+class ETagTransport(EC3SyntheticTransport):
+    """
+    Synthetic transport tagging every page with an ETag and answering HTTP 304 when it is sent back
+
+    :ivar list sent_headers: Headers received with each request
+    """
+
+    def __init__(self, records):
+        super().__init__(records)
+        self.sent_headers = []
+
+    def request(self, session, method, url, params=None, data=None, **kwargs):
+        headers = dict(kwargs.get("headers") or {})
+        self.sent_headers.append(headers)
+        if headers.get("If-None-Match") == ETAG:
+            with self._lock:
+                self.requests += 1
+            return _build_response(url, 304, {"ETag": ETAG}, b"")
+
+        response = super().request(session, method, url, params=params, **kwargs)
+        response.headers["ETag"] = ETAG
+        return response
+
+
+def make_materials(transport, cache):
+    ec3_materials = EC3Materials(bearer_token="unused")
+    ec3_materials.only_valid = False
+    ec3_materials.transport = transport
+    ec3_materials.rate_limiter = None
+    ec3_materials.cache = cache
+    return ec3_materials
+
+
+def test_fresh_entry_is_served_without_a_request(tmp_path):
+    transport = ETagTransport(synthetic_records(10))
+    cache = EC3ResponseCache(str(tmp_path / "cache.sqlite"))
+    ec3_materials = make_materials(transport, cache)
+
+    first = ec3_materials.get_materials(params={})
+    second = ec3_materials.get_materials(params={})
+
+    assert second == first
+    assert transport.requests == 1
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 1
+
+
+def test_stale_entry_is_revalidated_with_etag(tmp_path):
+    transport = ETagTransport(synthetic_records(10))
+    cache = EC3ResponseCache(str(tmp_path / "cache.sqlite"), default_ttl=0)
+    ec3_materials = make_materials(transport, cache)
+
+    first = ec3_materials.get_materials(params={})
+    second = ec3_materials.get_materials(params={})
+
+    assert second == first
+    assert transport.requests == 2
+    assert "If-None-Match" not in transport.sent_headers[0]
+    assert transport.sent_headers[1]["If-None-Match"] == ETAG
+    assert cache.revalidations == 1
+    assert cache.misses == 1
+
+
+def test_stale_entry_is_revalidated_from_async_client(tmp_path):
+    transport = ETagTransport(synthetic_records(10))
+    cache = EC3ResponseCache(str(tmp_path / "cache.sqlite"), default_ttl=0)
+
+    async def run():
+        client = AsyncEC3Materials(bearer_token="unused")
+        client.only_valid = False
+        client.transport = transport
+        client.rate_limiter = None
+        client.cache = cache
+        try:
+            first = await client.get_materials(params={})
+            second = await client.get_materials(params={})
+        finally:
+            await client.aclose()
+        return first, second
+
+    first, second = asyncio.run(run())
+
+    assert second == first
+    assert transport.sent_headers[1]["If-None-Match"] == ETAG
+    assert cache.revalidations == 1
+
+
+def test_ttl_uses_longest_matching_endpoint(tmp_path):
+    cache = EC3ResponseCache(
+        str(tmp_path / "cache.sqlite"),
+        default_ttl=60,
+        ttls={"materials": 0, "materials/statistics": 600},
+    )
+
+    assert cache.ttl_for("https://buildingtransparency.org/api/epds") == 60
+    assert cache.ttl_for("https://buildingtransparency.org/api/materials") == 0
+    assert (
+        cache.ttl_for("https://buildingtransparency.org/api/materials/statistics")
+        == 600
+    )
+
+
+def transport_sender(transport):
+    def send_request(method, url, params=None, headers=None):
+        return transport.request(None, method, url, params=params, headers=headers)
+
+    return send_request
+
+
+def test_endpoint_ttl_only_expires_matching_entries(tmp_path):
+    transport = ETagTransport(synthetic_records(10))
+    cache = EC3ResponseCache(
+        str(tmp_path / "cache.sqlite"), default_ttl=3600, ttls={"materials": 0}
+    )
+    send_request = transport_sender(transport)
+
+    for _ in range(2):
+        cache.send(send_request, "get", "https://example.org/api/materials")
+        cache.send(send_request, "get", "https://example.org/api/categories/root")
+
+    assert transport.requests == 3
+    assert cache.hits == 1
+    assert cache.revalidations == 1
+    assert cache.misses == 2
+
+
+def test_least_recently_used_entry_is_evicted(tmp_path):
+    transport = ETagTransport(synthetic_records(1))
+    body_size = len(transport.request(None, "get", "").content)
+    transport.reset()
+    cache = EC3ResponseCache(str(tmp_path / "cache.sqlite"), max_size=2 * body_size)
+    send_request = transport_sender(transport)
+
+    cache.send(send_request, "get", "https://example.org/a")
+    time.sleep(0.01)
+    cache.send(send_request, "get", "https://example.org/b")
+    time.sleep(0.01)
+    # Reading a makes b the least recently used entry
+    cache.send(send_request, "get", "https://example.org/a")
+    time.sleep(0.01)
+    cache.send(send_request, "get", "https://example.org/c")
+
+    assert cache.stats()["entries"] == 2
+    assert cache.stats()["size"] <= cache.max_size
+    assert cache.hits == 1
+
+    transport.reset()
+    cache.send(send_request, "get", "https://example.org/a")
+    cache.send(send_request, "get", "https://example.org/c")
+    assert transport.requests == 0
+
+    cache.send(send_request, "get", "https://example.org/b")
+    assert transport.requests == 1
@@ -0,0 +1,63 @@
+import json
+
+import pytest
+
+import ec3.ec3_api
+from ec3 import EC3Materials
+
+RECORD = {
+    "id": "a",
+    "gwp": None,
+    "category": {"id": "c", "masterformat": None},
+    "plant_or_group": {"latitude": 47.6, "longitude": None, "name": "Plant"},
+    "warnings": [None, {"code": None, "text": "Expired"}, [{"note": None}]],
+    "certifications": [{"name": "ISO", "expires": None}],
+}
+BODY = json.dumps([RECORD]).encode("utf-8")
+
+
+@pytest.fixture(params=["orjson", "json"])
+def ec3_materials(request, monkeypatch):
+    if request.param == "orjson":
+        pytest.importorskip("orjson")
+    else:
+        monkeypatch.setattr(ec3.ec3_api, "orjson", None)
+    return EC3Materials(bearer_token="unused")
+
+
+def process(ec3_materials, body=BODY):
+    return ec3_materials._clean_response(ec3_materials._decode(body))
+
+
+def test_nulls_are_removed_inside_lists_of_dicts(ec3_materials):
+    assert process(ec3_materials) == [
+        {
+            "id": "a",
+            "category": {"id": "c"},
+            "plant_or_group": {"latitude": 47.6, "name": "Plant"},
+            "warnings": [None, {"text": "Expired"}, [{}]],
+            "certifications": [{"name": "ISO"}],
+        }
+    ]
+
+
+def test_nulls_are_kept_when_disabled(ec3_materials):
+    ec3_materials.remove_nulls = False
+
+    assert process(ec3_materials) == [RECORD]
+
+
+def test_records_are_pruned_before_nulls_are_removed(ec3_materials, monkeypatch):
+    ec3_materials.return_fields = ["id", "plant_or_group.longitude"]
+    walked = []
+    remove_nulls = ec3_materials._remove_nulls
+
+    def spy(response):
+        walked.append(json.dumps(response))
+        return remove_nulls(response)
+
+    monkeypatch.setattr(ec3_materials, "_remove_nulls", spy)
+
+    assert process(ec3_materials) == [{"id": "a", "plant_or_group": {}}]
+    # Only the fast decoder path walks the records, and only the pruned ones
+    assert all("warnings" not in response for response in walked)
@@ -0,0 +1,39 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY_MODULES = ["numpy", "pandas", "pgeocode", "httpx", "pyarrow"]
+
+
+def loaded_after(statement):
+    """
+    Returns the heavy modules loaded by running statement in a fresh interpreter
+    """
+    code = "import json, sys\n{}\nprint(json.dumps([m for m in {!r} if m in sys.modules]))".format(
+        statement, HEAVY_MODULES
+    )
+    output = subprocess.run(
+        [sys.executable, "-c", code],
+        cwd=REPO_ROOT,
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout
+    return json.loads(output)
+
+
+@pytest.mark.parametrize(
+    "statement",
+    [
+        "import ec3",
+        "from ec3 import EC3epds",
+        "from ec3 import EC3Materials",
+        "from ec3 import EC3Categories, EC3Projects",
+    ],
+)
+def test_import_does_not_load_optional_dependencies(statement):
+    assert loaded_after(statement) == []
@@ -0,0 +1,146 @@
+import asyncio
+
+import pytest
+
+from ec3 import EC3Materials
+from ec3.ec3_transport import EC3SyntheticTransport, synthetic_records
+
+RECORD_COUNT = 2000  # 8 pages of the 250 record Api maximum
+
+
+class HeaderlessTransport(EC3SyntheticTransport):
+    """
+    Synthetic transport that does not report the total count, like endpoints without paging headers
+    """
+
+    def request(self, session, method, url, params=None, data=None, **kwargs):
+        response = super().request(session, method, url, params=params, **kwargs)
+        del response.headers["X-Total-Count"]
+        return response
+
+
+class ShiftingTransport(EC3SyntheticTransport):
+    """
+    Synthetic transport where a new record is inserted at the front after the first page is served,
+    so every later offset page starts with the last record of the page before it
+    """
+
+    def request(self, session, method, url, params=None, data=None, **kwargs):
+        response = super().request(session, method, url, params=params, **kwargs)
+        if self.requests == 1:
+            self.records.insert(0, dict(self.records[0], id="inserted"))
+        return response
+
+
+@pytest.fixture
+def records():
+    return synthetic_records(RECORD_COUNT)
+
+
+def make_materials(transport, **attributes):
+    ec3_materials = EC3Materials(bearer_token="unused")
+    ec3_materials.only_valid = False
+    ec3_materials.transport = transport
+    for name, value in attributes.items():
+        setattr(ec3_materials, name, value)
+    return ec3_materials
+
+
+def test_return_all_requests_each_page_once(records):
+    transport = EC3SyntheticTransport(records)
+    result = make_materials(transport).get_materials(return_all=True, params={})
+
+    assert len(result) == RECORD_COUNT
+    assert transport.requests == 8
+
+
+def test_return_all_without_headers_stops_at_empty_page(records):
+    transport = HeaderlessTransport(records)
+    result = make_materials(transport).get_materials(return_all=True, params={})
+
+    assert len(result) == RECORD_COUNT
+    assert transport.requests == 9
+
+
+def test_total_count_hint_skips_empty_page(records):
+    transport = HeaderlessTransport(records)
+    result = make_materials(transport).get_materials(
+        return_all=True, total_count=RECORD_COUNT, params={}
+    )
+
+    assert len(result) == RECORD_COUNT
+    assert transport.requests == 8
+
+
+def test_max_workers_does_not_request_past_last_page(records):
+    transport = EC3SyntheticTransport(records)
+    result = make_materials(transport, max_workers=4).get_materials(
+        return_all=True, params={}
+    )
+
+    assert [r["id"] for r in result] == [r["id"] for r in records]
+    assert transport.requests == 8
+
+
+def test_capped_pull_uses_fewest_pages(records):
+    transport = EC3SyntheticTransport(records)
+    result = make_materials(transport, max_records=600).get_materials(params={})
+
+    assert len(result) == 600
+    assert transport.requests == 3
+
+
+def test_shifted_pages_are_not_duplicated(records):
+    transport = ShiftingTransport(records)
+    result = make_materials(transport).get_materials(return_all=True, params={})
+
+    ids = [r["id"] for r in result]
+    assert len(ids) == len(set(ids)) == RECORD_COUNT
+    assert transport.requests == 9
+
+
+def test_iter_stops_requesting_when_loop_breaks(records):
+    transport = EC3SyntheticTransport(records)
+    ec3_materials = make_materials(transport, prefetch=False)
+
+    for page in ec3_materials.iter_materials(by_page=True, params={}):
+        break
+
+    assert len(page) == 250
+    assert transport.requests == 1
+
+
+def test_async_clients_share_the_engine(records):
+    pytest.importorskip("httpx")
+    from ec3 import AsyncEC3Materials
+
+    async def pull(**kwargs):
+        ec3_materials = AsyncEC3Materials(bearer_token="unused")
+        ec3_materials.only_valid = False
+        ec3_materials.transport = transport
+        ec3_materials.max_workers = 4
+        try:
+            return await ec3_materials.get_materials(params={}, **kwargs)
+        finally:
+            await ec3_materials.aclose()
+
+    transport = HeaderlessTransport(records)
+    result = asyncio.run(pull(return_all=True, total_count=RECORD_COUNT))
+    assert [r["id"] for r in result] == [r["id"] for r in records]
+    assert transport.requests == 8
+
+    transport = ShiftingTransport(synthetic_records(RECORD_COUNT))
+    ids = [r["id"] for r in asyncio.run(pull(return_all=True))]
+    assert len(ids) == len(set(ids)) == RECORD_COUNT
+
+
+def test_disabling_prefetch_keeps_requests_in_step(records):
+    transport = EC3SyntheticTransport(records)
+    ec3_materials = make_materials(transport, prefetch=False)
+    pages = ec3_materials.iter_materials(by_page=True, params={})
+
+    next(pages)
+    next(pages)
+
+    assert transport.requests == 2
+    pages.close()
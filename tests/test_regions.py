@@ -0,0 +1,87 @@
+import asyncio
+
+import pytest
+
+from ec3 import EC3Materials
+
+SITES = [(40.0, -75.0), (41.0, -76.0)]
+
+
+def site_records():
+    """
+    Records returned for each site: a shared material without plant coordinates,
+    returned twice by the first site, and two materials without an id
+    """
+    shared = {"id": "shared", "name": "Shared"}
+    return [
+        [shared, dict(shared), {"name": "No id A"}],
+        [dict(shared), {"name": "No id B"}],
+    ]
+
+
+def fake_get_materials(results):
+    calls = []
+
+    def get_materials(return_all=False, **params):
+        site_params = params["params"]
+        calls.append((site_params["latitude"], site_params["longitude"]))
+        return [dict(r) for r in results[SITES.index(calls[-1])]]
+
+    return get_materials
+
+
+def check_merged(records):
+    assert [r.get("id") for r in records] == ["shared", None, None]
+    assert records[0]["region_sites"] == [0, 1]
+    assert records[1]["name"] == "No id A"
+    assert records[1]["region_sites"] == [0]
+    assert records[2]["name"] == "No id B"
+    assert records[2]["region_sites"] == [1]
+
+
+def test_regions_keep_records_without_id():
+    ec3_materials = EC3Materials(bearer_token="unused")
+    ec3_materials.get_materials = fake_get_materials(site_records())
+
+    check_merged(ec3_materials.get_materials_within_regions(SITES, params={}))
+
+
+def test_async_regions_keep_records_without_id():
+    pytest.importorskip("httpx")
+    from ec3 import AsyncEC3Materials
+
+    async def run():
+        ec3_materials = AsyncEC3Materials(bearer_token="unused")
+        get_materials = fake_get_materials(site_records())
+
+        async def async_get_materials(**params):
+            return get_materials(**params)
+
+        ec3_materials.get_materials = async_get_materials
+        try:
+            return await ec3_materials.get_materials_within_regions(SITES, params={})
+        finally:
+            await ec3_materials.aclose()
+
+    check_merged(asyncio.run(run()))
+
+
+def test_regions_combine_local_distance_with_returned_sites():
+    near_both = {
+        "id": "near_both",
+        "plant_or_group": {"latitude": 40.5, "longitude": -75.5},
+    }
+    # Over 300 km from both sites, as if the server measured the distance differently
+    past_boundary = {
+        "id": "past_boundary",
+        "plant_or_group": {"latitude": 43.0, "longitude": -75.0},
+    }
+    ec3_materials = EC3Materials(bearer_token="unused")
+    ec3_materials.get_materials = fake_get_materials([[near_both, past_boundary], []])
+
+    records = ec3_materials.get_materials_within_regions(SITES, params={})
+
+    assert [r["id"] for r in records] == ["near_both", "past_boundary"]
+    # Found within plant_distance of the second site although only the first site's query returned it
+    assert records[0]["region_sites"] == [0, 1]
+    assert records[1]["region_sites"] == [0]
@@ -0,0 +1,117 @@
+import email.utils
+import time
+
+import pytest
+import requests
+
+from ec3 import EC3Materials
+from ec3.ec3_retry import EC3RateLimiter, EC3RetryPolicy
+from ec3.ec3_transport import EC3SyntheticTransport, _build_response, synthetic_records
+
+
+class FlakyTransport(EC3SyntheticTransport):
+    """
+    Synthetic transport failing the requests listed in failures before serving pages
+
+    failures maps the (1-based) number of a request to the status code and headers returned for it.
+    """
+
+    def __init__(self, records, failures):
+        super().__init__(records)
+        self.failures = failures
+        self.sent = 0
+
+    def request(self, session, method, url, params=None, data=None, **kwargs):
+        self.sent += 1
+        if self.sent in self.failures:
+            status_code, headers = self.failures[self.sent]
+            return _build_response(url, status_code, headers, b'{"error": "Failed"}')
+        if method.lower() == "post":
+            return _build_response(
+                url,
+                200,
+                {"Content-Type": "application/json"},
+                b'{"material_filter_str": "!EC3 search(\\"ReadyMix\\", 1 m3) WHERE"}',
+            )
+        return super().request(session, method, url, params=params, **kwargs)
+
+
+def make_materials(transport, max_retries=3):
+    ec3_materials = EC3Materials(bearer_token="unused")
+    ec3_materials.only_valid = False
+    ec3_materials.transport = transport
+    ec3_materials.retry_policy = EC3RetryPolicy(
+        max_retries=max_retries, backoff_factor=0
+    )
+    ec3_materials.rate_limiter = None
+    ec3_materials.mf_cache = None
+    return ec3_materials
+
+
+@pytest.mark.parametrize("status_code", [429, 502])
+def test_throttled_and_failed_pages_are_retried(status_code):
+    transport = FlakyTransport(synthetic_records(600), {2: (status_code, {})})
+    ec3_materials = make_materials(transport)
+
+    result = ec3_materials.get_materials(return_all=True, params={})
+
+    assert len(result) == 600
+    assert transport.sent == 4
+    assert ec3_materials.retry_policy.retries == 1
+
+
+def test_retry_after_is_honoured():
+    transport = FlakyTransport(synthetic_records(10), {1: (429, {"Retry-After": "1"})})
+    ec3_materials = make_materials(transport)
+
+    started = time.perf_counter()
+    ec3_materials.get_materials(params={})
+
+    assert time.perf_counter() - started >= 1
+    assert ec3_materials.retry_policy.retry_wait_time == 1
+
+
+def test_retry_after_http_date():
+    retry_policy = EC3RetryPolicy()
+    retry_at = email.utils.formatdate(time.time() + 30, usegmt=True)
+    response = _build_response("", 503, {"Retry-After": retry_at}, b"")
+
+    assert 28 <= retry_policy.get_backoff(0, response) <= 30
+
+
+def test_error_is_raised_when_retries_run_out():
+    failures = {n: (503, {}) for n in range(1, 10)}
+    transport = FlakyTransport(synthetic_records(10), failures)
+    ec3_materials = make_materials(transport, max_retries=2)
+
+    with pytest.raises(requests.exceptions.HTTPError):
+        ec3_materials.get_materials(params={})
+    assert transport.sent == 3
+
+
+def test_failed_page_raises_instead_of_truncating():
+    transport = FlakyTransport(synthetic_records(1000), {3: (500, {})})
+    ec3_materials = make_materials(transport, max_retries=0)
+
+    with pytest.raises(requests.exceptions.HTTPError):
+        ec3_materials.get_materials(return_all=True, params={})
+
+
+def test_material_filter_post_takes_a_rate_limiter_token():
+    transport = FlakyTransport([], {})
+    ec3_materials = make_materials(transport)
+    ec3_materials.rate_limiter = EC3RateLimiter(rate=0.001, burst=3)
+
+    ec3_materials.compile_mf_string("ReadyMix", [])
+
+    # The bucket barely refills at this rate, so one token is gone
+    assert 1.9 < ec3_materials.rate_limiter._tokens < 2.1
+
+
+def test_material_filter_post_is_not_retried():
+    transport = FlakyTransport([], {1: (503, {})})
+    ec3_materials = make_materials(transport)
+
+    with pytest.raises(requests.exceptions.HTTPError):
+        ec3_materials.compile_mf_string("ReadyMix", [])
+    assert transport.sent == 1
@@ -0,0 +1,26 @@
+import pytest
+
+pytest.importorskip("pandas")
+
+from ec3.ec3_stats import gwp_statistics  # noqa: E402
+from ec3.ec3_transport import synthetic_records  # noqa: E402
+
+
+def test_statistics_have_a_row_per_category_and_unit():
+    stats = gwp_statistics(synthetic_records(200))
+
+    assert stats["count"].sum() == 200
+    assert (stats["pct20"] <= stats["pct80"]).all()
+    assert (stats["conservative_baseline"] == stats["pct80"]).all()
+
+
+@pytest.mark.parametrize("null_gwp", [False, True])
+def test_statistics_without_gwp_values_are_empty(null_gwp):
+    records = synthetic_records(20) if null_gwp else []
+    for record in records:
+        record["gwp"] = None
+
+    stats = gwp_statistics(records)
+
+    assert stats.empty
+    assert list(stats.columns) == list(gwp_statistics(synthetic_records(20)).columns)
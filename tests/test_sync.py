@@ -0,0 +1,73 @@
+import asyncio
+
+import pytest
+
+from ec3 import EC3epds
+from ec3.ec3_store import EC3LocalStore
+from ec3.ec3_transport import EC3SyntheticTransport, synthetic_records
+
+
+class RecordingTransport(EC3SyntheticTransport):
+    """
+    Synthetic transport keeping the params of every request
+    """
+
+    def __init__(self, records):
+        super().__init__(records)
+        self.sent_params = []
+
+    def request(self, session, method, url, params=None, data=None, **kwargs):
+        self.sent_params.append(dict(params or {}))
+        return super().request(session, method, url, params=params, **kwargs)
+
+
+@pytest.fixture
+def records():
+    records = synthetic_records(300)
+    for i, record in enumerate(records):
+        record["updated_on"] = "2026-01-{:02d}T00:00:00Z".format(i % 28 + 1)
+    return records
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = EC3LocalStore(str(tmp_path / "store.sqlite"))
+    yield store
+    store.close()
+
+
+def test_sync_refetches_from_the_high_water_mark(records, store):
+    transport = RecordingTransport(records)
+    ec3_epds = EC3epds(bearer_token="unused")
+    ec3_epds.only_valid = False
+    ec3_epds.transport = transport
+
+    assert ec3_epds.sync_epds(store, params={}) == 300
+    assert store.get_high_water_mark("epds") == "2026-01-28T00:00:00Z"
+    assert "updated_on__gte" not in transport.sent_params[0]
+
+    ec3_epds.sync_epds(store, params={})
+    assert transport.sent_params[-1]["updated_on__gte"] == "2026-01-28T00:00:00Z"
+    assert store.count("epds") == 300
+
+
+def test_async_sync_merges_pages(records, store):
+    pytest.importorskip("httpx")
+    from ec3 import AsyncEC3epds
+
+    transport = RecordingTransport(records)
+
+    async def sync_twice():
+        ec3_epds = AsyncEC3epds(bearer_token="unused")
+        ec3_epds.only_valid = False
+        ec3_epds.transport = transport
+        try:
+            first = await ec3_epds.sync_epds(store, params={})
+            await ec3_epds.sync_epds(store, params={})
+            return first
+        finally:
+            await ec3_epds.aclose()
+
+    assert asyncio.run(sync_twice()) == 300
+    assert store.get_high_water_mark("epds") == "2026-01-28T00:00:00Z"
+    assert transport.sent_params[-1]["updated_on__gte"] == "2026-01-28T00:00:00Z"